@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Analytics Snapshot Export for GST Pro
+Writes gstr1_records, gstr3b_records, client_assignments and clients to columnar
+Parquet (or Arrow IPC) files that analysts can query without touching the live database.
+
+Layout (Hive-style partitions, readable by pandas, DuckDB, Spark, Power BI):
+  analytics/gstr1_records/fy=2024-25/period=2024-04/part-0.parquet
+  analytics/gstr3b_records/fy=2024-25/period=2024-04/part-0.parquet
+  analytics/client_assignments/fy=2024-25/period=2024-04/part-0.parquet
+  analytics/clients/part-0.parquet
+  analytics/_manifest.json
+
+Amounts are integer paise, as stored. Rows are streamed from a read-only snapshot
+in batches, so memory stays bounded.
+Re-running only rewrites partitions whose data changed since the last export
+(tracked in _manifest.json); use --full to rewrite everything.
+
+Requires pyarrow:  pip install pyarrow
+
+Usage:
+  python analytics_export.py --from 2023-04 --to 2026-03
+  python analytics_export.py --from 2020-04 --to 2026-03 --archives   # include archived FY files
+  python analytics_export.py --format arrow --out D:\\analytics
+  python analytics_export.py --firm abc                                # multi-firm mode
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+
+import app as gstpro
+
+PERIOD_TABLES = ('gstr1_records', 'gstr3b_records', 'client_assignments')
+MAX_ATTACHED = 9  # SQLite attaches at most 10 databases by default, one is the snapshot itself
+
+
+def parse_period(value):
+    year, month = value.split('-')
+    return int(month), int(year)
+
+
+def iter_periods(start, end):
+    m, y = start
+    while (y, m) <= (end[1], end[0]):
+        yield m, y
+        m, y = (1, y + 1) if m == 12 else (m + 1, y)
+
+
+def arrow_schema(conn, table):
+    import pyarrow as pa
+    fields = []
+    for col in conn.execute(f"PRAGMA table_info({table})"):
+        declared = (col['type'] or '').upper()
+        if 'INT' in declared:
+            arrow_type = pa.int64()
+        elif 'REAL' in declared or 'FLOA' in declared or 'DOUB' in declared:
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()  # TEXT and TIMESTAMP (stored as ISO text)
+        fields.append(pa.field(col['name'], arrow_type))
+    return pa.schema(fields)
+
+
+def coerce(value, arrow_type):
+    """SQLite is loosely typed; make each value fit its column's Arrow type"""
+    import pyarrow as pa
+    if value is None:
+        return None
+    if pa.types.is_string(arrow_type):
+        return str(value)
+    if pa.types.is_integer(arrow_type):
+        return int(value)
+    return float(value)
+
+
+def write_partition(cursor, schema, path, fmt, batch_size):
+    """Stream cursor rows into one file, batch by batch. Returns rows written (0 = no file)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tmp_path = f"{path}.tmp"
+    writer = None
+    rows = 0
+    types = [field.type for field in schema]
+    try:
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            columns = [pa.array([coerce(row[i], t) for row in batch], type=t) for i, t in enumerate(types)]
+            record_batch = pa.RecordBatch.from_arrays(columns, schema=schema)
+            if writer is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if fmt == 'parquet':
+                    writer = pq.ParquetWriter(tmp_path, schema, compression='zstd')
+                else:
+                    writer = pa.ipc.new_file(tmp_path, schema)
+            writer.write_batch(record_batch)
+            rows += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if rows:
+        os.replace(tmp_path, path)
+    elif os.path.exists(path):
+        os.remove(path)  # partition emptied since the last export
+    return rows
+
+
+def find_archives():
+    """Archived FY database files, newest first, as {alias: path}"""
+    paths = sorted(glob.glob(os.path.join(gstpro.firm_dir(gstpro.ARCHIVE_DIR), 'gst_archive_*.db')), reverse=True)
+    if len(paths) > MAX_ATTACHED:
+        print(f"! {len(paths)} archives found, only the newest {MAX_ATTACHED} are included")
+        paths = paths[:MAX_ATTACHED]
+    return {f"arc{i}": path for i, path in enumerate(paths)}
+
+
+def select_columns(conn, source, table, schema):
+    """Column list for one source; archives made before the paise migration hold REAL rupees"""
+    declared = {col['name']: (col['type'] or '').upper() for col in conn.execute(f"PRAGMA {source}.table_info({table})")}
+    money = gstpro.MONEY_COLUMNS.get(table, ())
+    return ", ".join(f'CAST(ROUND("{f.name}" * 100) AS INTEGER)' if f.name in money and declared.get(f.name) == 'REAL'
+                     else f'"{f.name}"' for f in schema)
+
+
+def partition_fingerprint(conn, table, source, month, year, versions, archives):
+    """Cheap value that changes whenever the partition's rows may have changed"""
+    if source != 'main':
+        return f"{os.path.basename(archives[source])}:{os.path.getmtime(archives[source]):.0f}"
+    if table in ('gstr1_records', 'gstr3b_records'):
+        return f"v{versions.get((month, year), 0)}"
+    # client_assignments has no version row; hash its (small) monthly slice instead
+    digest = hashlib.sha1()
+    for row in conn.execute(f"SELECT * FROM {table} WHERE month=? AND year=? ORDER BY id", (month, year)):
+        digest.update(repr(tuple(row)).encode())
+    return digest.hexdigest()
+
+
+def export(args):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("✗ pyarrow is required: pip install pyarrow")
+        return 1
+
+    ext = 'parquet' if args.format == 'parquet' else 'arrow'
+    manifest_path = os.path.join(args.out, '_manifest.json')
+    manifest = {}
+    if os.path.exists(manifest_path) and not args.full:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    if manifest.get('format') not in (None, args.format):
+        manifest = {}  # format changed, rewrite everything
+    partitions = manifest.setdefault('partitions', {})
+    manifest['format'] = args.format
+
+    gstpro.init_db()  # bring an older database up to the current schema (paise amounts) first
+    archives = find_archives() if args.archives else {}
+    conn = gstpro.get_read_db(attach=archives)
+    versions = {(r['month'], r['year']): r['version'] for r in conn.execute("SELECT * FROM data_versions")}
+    schemas = {table: arrow_schema(conn, table) for table in PERIOD_TABLES + ('clients',)}
+    written = skipped = 0
+
+    def save_manifest():
+        manifest['exported_at'] = datetime.now().isoformat(timespec='seconds')
+        tmp = f"{manifest_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, manifest_path)
+
+    os.makedirs(args.out, exist_ok=True)
+    for month, year in iter_periods(args.start, args.end):
+        fy = gstpro.get_financial_year(month, year)
+        for table in PERIOD_TABLES:
+            # Live data wins; archives only fill periods no longer in the main database
+            source = 'main'
+            if archives and not conn.execute(f"SELECT 1 FROM main.{table} WHERE month=? AND year=? LIMIT 1",
+                                             (month, year)).fetchone():
+                for alias in archives:
+                    if conn.execute(f"SELECT 1 FROM {alias}.{table} WHERE month=? AND year=? LIMIT 1",
+                                    (month, year)).fetchone():
+                        source = alias
+                        break
+
+            key = f"{table}/fy={fy}/period={year:04d}-{month:02d}"
+            fingerprint = partition_fingerprint(conn, table, source, month, year, versions, archives)
+            if partitions.get(key, {}).get('fingerprint') == fingerprint:
+                skipped += 1
+                continue
+
+            path = os.path.join(args.out, *key.split('/'), f"part-0.{ext}")
+            columns = select_columns(conn, source, table, schemas[table])
+            cursor = conn.execute(f"SELECT {columns} FROM {source}.{table} WHERE month=? AND year=? ORDER BY id",
+                                  (month, year))
+            rows = write_partition(cursor, schemas[table], path, args.format, args.batch_size)
+            partitions[key] = {'fingerprint': fingerprint, 'rows': rows,
+                               'source': 'main' if source == 'main' else os.path.basename(archives[source])}
+            written += 1
+            save_manifest()
+            if rows:
+                print(f"  ✓ {key}: {rows} rows")
+
+    # Client master is small and unpartitioned - one snapshot file
+    fingerprint = f"c{versions.get((0, 0), 0)}"
+    if partitions.get('clients', {}).get('fingerprint') != fingerprint:
+        columns = ", ".join(f'"{f.name}"' for f in schemas['clients'])
+        cursor = conn.execute(f"SELECT {columns} FROM clients ORDER BY id")
+        rows = write_partition(cursor, schemas['clients'], os.path.join(args.out, 'clients', f"part-0.{ext}"),
+                               args.format, args.batch_size)
+        partitions['clients'] = {'fingerprint': fingerprint, 'rows': rows, 'source': 'main'}
+        written += 1
+        print(f"  ✓ clients: {rows} rows")
+    else:
+        skipped += 1
+
+    conn.close()
+    save_manifest()
+    print("="*50)
+    print(f"✅ {written} partitions written, {skipped} unchanged → {os.path.abspath(args.out)}")
+    return 0
+
+
+def main():
+    month, year = gstpro.get_current_month_year()
+    fy_start = f"{year if month >= 4 else year - 1}-04"
+
+    parser = argparse.ArgumentParser(description='GST Pro analytics snapshot export')
+    parser.add_argument('--out', default='analytics')
+    parser.add_argument('--from', dest='start', type=parse_period, default=parse_period(fy_start),
+                        help='first period, YYYY-MM (default: start of current FY)')
+    parser.add_argument('--to', dest='end', type=parse_period, default=(month, year),
+                        help='last period, YYYY-MM (default: current filing month)')
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+    parser.add_argument('--archives', action='store_true', help='include archived FY database files')
+    parser.add_argument('--full', action='store_true', help='rewrite every partition')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--firm', help='firm to export (multi-firm mode)')
+    args = parser.parse_args()
+
+    if args.firm:
+        with gstpro.use_firm(args.firm):
+            return export(args)
+    return export(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,20 +3,30 @@
 GST Pro v2.0 - Complete Working Version
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file, Response
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file, Response, g, abort
+from flask import stream_template, stream_with_context, get_flashed_messages
 from functools import wraps
-from werkzeug.security import generate_password_hash, check_password_hash
+from contextlib import contextmanager
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 from datetime import datetime, timedelta
 import sqlite3
 import os
 import json
-import shutil
 import logging
 from logging.handlers import RotatingFileHandler
-import pandas as pd
 from io import BytesIO
 import csv
 import io
+import hashlib
+import gzip
+import zlib
+import tempfile
+import re
+import contextvars
+import threading
+import time
+from urllib.parse import quote
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 
 app = Flask(__name__)
 app.secret_key = 'gst-pro-v2-secret-key-2026-change-in-production'
@@ -33,10 +43,38 @@ app.logger.addHandler(file_handler)
 app.logger.setLevel(logging.INFO)
 
 # Constants
+DATABASE = 'gst_database.db'
+DB_TIMEOUT = 30  # seconds a connection waits on a locked database before failing
+SCHEMA_VERSION = 10  # bump whenever init_db creates or changes tables, triggers or indexes
 BACKUP_DIR = 'backups'
 ARCHIVE_DIR = 'archive'
+EXPORT_CACHE_DIR = 'cache/exports'
+EXPORT_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256 MB per firm, oldest-used artifacts evicted first
+AUDIT_ARCHIVE_DIR = 'archive/audit'
+AUDIT_RETENTION_MONTHS = 6  # activity older than this moves to monthly .jsonl.gz archives
+AUDIT_PAGE_SIZE = 50
+NOTIFICATION_RETENTION_DAYS = 90  # read notifications older than this are pruned
+NOTIFICATION_PAGE_SIZE = 20
+CLIENT_SEARCH_LIMIT = 20
+ASSET_CACHE_DIR = 'cache/assets'  # pre-compressed .gz/.br copies of static files, keyed by content hash
+ASSET_MAX_AGE = 365 * 24 * 3600  # hashed asset URLs never change content, so browsers keep them a year
+COMPRESS_MIN_BYTES = 1024  # smaller responses are not worth gzipping
+COMPRESS_MIMETYPES = ('text/html', 'application/json')
+PAGE_SIZE = 50  # rows per page on streamed list pages (admin users, dashboard worklists)
+STREAM_CHUNK_CHARS = 8192  # streamed pages are sent in pieces of about this size
+MAINTENANCE_HOURS = (1, 5)  # local hours [start, end) when the scheduler may run database maintenance
+MAINTENANCE_INTERVAL = 15 * 60  # seconds between scheduler passes
+MAINTENANCE_IDLE_MINUTES = 10  # skip a pass if any GST data was written this recently
+MAINTENANCE_VACUUM_PAGES = 2000  # free pages released per incremental vacuum step (8 MB at 4 KB pages)
+MAINTENANCE_ANALYSIS_LIMIT = 1000  # rows ANALYZE samples per index, keeps the daily ANALYZE short
+MAINTENANCE_CONVERT_MAX_BYTES = 512 * 1024 * 1024  # one-off full VACUUM to enable auto_vacuum only below this size
+MAINTENANCE_HISTORY_DAYS = 365
+FIRMS_DIR = os.environ.get('GSTPRO_FIRMS_DIR', 'firms')
+MULTI_FIRM = os.environ.get('GSTPRO_MULTI_FIRM', '0') == '1'  # one database per firm under FIRMS_DIR
+FIRM_SLUG_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,39}$')
 os.makedirs(BACKUP_DIR, exist_ok=True)
 os.makedirs(ARCHIVE_DIR, exist_ok=True)
+os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
 
 # ==================== HELPERS ====================
 
@@ -46,6 +84,11 @@ def get_current_month_year():
     last_month = first_day - timedelta(days=1)
     return last_month.month, last_month.year
 
+def get_fy_periods(month, year):
+    """All (month, year) periods of the financial year containing the given month"""
+    start = year if month >= 4 else year - 1
+    return [(m, start) for m in range(4, 13)] + [(m, start + 1) for m in range(1, 4)]
+
 def get_financial_year(month, year):
     if month >= 4:
         return f"{year}-{str(year+1)[-2:]}"
@@ -69,15 +112,117 @@ def get_due_status_color(month, year, status, return_type):
     else:
         return 'yellow'
 
+# ==================== FIRMS (SHARDS) ====================
+# In multi-firm mode every firm has its own database file, FIRMS_DIR/<firm>.db.
+# The firm for the current request (or fan-out task) lives in a context variable
+# that get_db()/get_read_db() and the per-firm directories read from.
+
+_current_firm = contextvars.ContextVar('gstpro_firm', default=None)
+
+def is_valid_firm(firm):
+    return bool(firm) and FIRM_SLUG_RE.match(firm) is not None
+
+def firm_db_path(firm):
+    return os.path.join(FIRMS_DIR, f"{firm}.db") if firm else DATABASE
+
+def current_db_path():
+    firm = _current_firm.get()
+    if firm:
+        return firm_db_path(firm)
+    if MULTI_FIRM:
+        raise RuntimeError('No firm selected for this database access')
+    return DATABASE
+
+def firm_dir(base):
+    """Per-firm subdirectory of base (backups, archives, caches); base itself in single-firm mode"""
+    firm = _current_firm.get()
+    path = os.path.join(base, firm) if firm else base
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def list_firms():
+    if not os.path.isdir(FIRMS_DIR):
+        return []
+    return sorted(name[:-3] for name in os.listdir(FIRMS_DIR)
+                  if name.endswith('.db') and is_valid_firm(name[:-3]))
+
+def firm_exists(firm):
+    return is_valid_firm(firm) and os.path.exists(firm_db_path(firm))
+
+@contextmanager
+def use_firm(firm):
+    token = _current_firm.set(firm)
+    try:
+        yield
+    finally:
+        _current_firm.reset(token)
+
+def for_each_firm(task, max_workers=8):
+    """Run task(firm) against every firm's shard in parallel, returning {firm: result}.
+
+    A shard that raises maps to its exception so one broken firm never stops the
+    others. In single-firm mode the task simply runs once with firm=None.
+    """
+    if not MULTI_FIRM:
+        return {None: task(None)}
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run(firm):
+        with use_firm(firm):
+            return task(firm)
+
+    firms = list_firms()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(firms)))) as pool:
+        futures = {firm: pool.submit(run, firm) for firm in firms}
+        for firm, future in futures.items():
+            try:
+                results[firm] = future.result()
+            except Exception as e:
+                app.logger.error(f'Firm {firm}: {e}')
+                results[firm] = e
+    return results
+
 def get_db():
-    conn = sqlite3.connect('gst_database.db')
+    conn = sqlite3.connect(current_db_path(), timeout=DB_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def read_only_uri(db_path):
+    path = os.path.abspath(db_path).replace(os.sep, '/')
+    if not path.startswith('/'):
+        path = '/' + path  # Windows drive paths: file:/C:/...
+    return f"file:{quote(path)}?mode=ro"
+
+def get_read_db(attach=None):
+    """Read-only connection for reports, exports and dashboards.
+
+    Opened with mode=ro so it can never write, and held in one read transaction so
+    every query sees the same snapshot. Under WAL it neither blocks nor waits for
+    autosaves; writes always go through get_db(). attach maps schema names to
+    other database files (e.g. FY archives) attached read-only before the snapshot.
+    """
+    conn = sqlite3.connect(read_only_uri(current_db_path()), uri=True, timeout=DB_TIMEOUT)
     conn.row_factory = sqlite3.Row
+    for alias, db_path in (attach or {}).items():
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (read_only_uri(db_path),))
+    conn.execute("BEGIN")
     return conn
 
 def init_db():
     conn = get_db()
     c = conn.cursor()
 
+    # Schema already current - skip the DDL and admin lookup on every start
+    if c.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        conn.close()
+        return
+
+    # New files free pages incrementally; existing ones are converted by run_maintenance()
+    if c.execute("PRAGMA page_count").fetchone()[0] == 0:
+        c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
     # Users
     c.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -101,6 +246,38 @@ def init_db():
         )
     """)
 
+    c.execute("CREATE INDEX IF NOT EXISTS idx_clients_status_name ON clients (status, client_name, id)")
+
+    # Client search index (trigram FTS5: substring matches on name and GSTIN).
+    # External-content table kept in sync by triggers; skipped if FTS5 is unavailable.
+    try:
+        c.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+                client_name, gstin, content='clients', content_rowid='id', tokenize='trigram'
+            )
+        """)
+        c.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_clients_fts_insert AFTER INSERT ON clients BEGIN
+                INSERT INTO clients_fts (rowid, client_name, gstin) VALUES (NEW.id, NEW.client_name, NEW.gstin);
+            END
+        """)
+        c.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_clients_fts_delete AFTER DELETE ON clients BEGIN
+                INSERT INTO clients_fts (clients_fts, rowid, client_name, gstin)
+                VALUES ('delete', OLD.id, OLD.client_name, OLD.gstin);
+            END
+        """)
+        c.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_clients_fts_update AFTER UPDATE OF client_name, gstin ON clients BEGIN
+                INSERT INTO clients_fts (clients_fts, rowid, client_name, gstin)
+                VALUES ('delete', OLD.id, OLD.client_name, OLD.gstin);
+                INSERT INTO clients_fts (rowid, client_name, gstin) VALUES (NEW.id, NEW.client_name, NEW.gstin);
+            END
+        """)
+        c.execute("INSERT INTO clients_fts (clients_fts) VALUES ('rebuild')")
+    except sqlite3.OperationalError as e:
+        app.logger.warning(f'Client search index unavailable, falling back to LIKE: {e}')
+
     # Assignments
     c.execute("""
         CREATE TABLE IF NOT EXISTS client_assignments (
@@ -131,7 +308,35 @@ def init_db():
         )
     """)
 
-    # GSTR-1 Records
+    c.execute("CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications (user_id, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications (user_id, id) WHERE is_read = 0")
+
+    # Unread counts per user - kept in step with notifications by the triggers below
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS notification_counters (
+            user_id INTEGER PRIMARY KEY,
+            unread INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for name, event, delta in (
+            ('insert', "AFTER INSERT ON notifications WHEN NEW.is_read = 0", "NEW.user_id, 1"),
+            ('read', "AFTER UPDATE OF is_read ON notifications WHEN OLD.is_read = 0 AND NEW.is_read = 1", "NEW.user_id, -1"),
+            ('unread', "AFTER UPDATE OF is_read ON notifications WHEN OLD.is_read = 1 AND NEW.is_read = 0", "NEW.user_id, 1"),
+            ('delete', "AFTER DELETE ON notifications WHEN OLD.is_read = 0", "OLD.user_id, -1")):
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_notifications_{name}_counter {event}
+            BEGIN
+                INSERT INTO notification_counters (user_id, unread) VALUES ({delta})
+                ON CONFLICT(user_id) DO UPDATE SET unread = MAX(0, unread + excluded.unread);
+            END
+        """)
+    # Recount from the rows themselves whenever the schema is (re)initialised
+    c.execute("""
+        INSERT OR REPLACE INTO notification_counters (user_id, unread)
+        SELECT user_id, SUM(is_read = 0) FROM notifications GROUP BY user_id
+    """)
+
+    # GSTR-1 Records (all amounts in integer paise, see MONEY)
     c.execute("""
         CREATE TABLE IF NOT EXISTS gstr1_records (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -139,17 +344,17 @@ def init_db():
             month INTEGER NOT NULL,
             year INTEGER NOT NULL,
             status TEXT DEFAULT 'draft',
-            b2b_sales REAL DEFAULT 0,
-            b2c_sales REAL DEFAULT 0,
-            credit_note REAL DEFAULT 0,
-            debit_note REAL DEFAULT 0,
-            sez_exempted REAL DEFAULT 0,
-            total_sales REAL DEFAULT 0,
-            sales_as_per_tally REAL DEFAULT 0,
-            variance REAL DEFAULT 0,
-            total_cgst REAL DEFAULT 0,
-            total_sgst REAL DEFAULT 0,
-            total_igst REAL DEFAULT 0,
+            b2b_sales INTEGER DEFAULT 0,
+            b2c_sales INTEGER DEFAULT 0,
+            credit_note INTEGER DEFAULT 0,
+            debit_note INTEGER DEFAULT 0,
+            sez_exempted INTEGER DEFAULT 0,
+            total_sales INTEGER DEFAULT 0,
+            sales_as_per_tally INTEGER DEFAULT 0,
+            variance INTEGER DEFAULT 0,
+            total_cgst INTEGER DEFAULT 0,
+            total_sgst INTEGER DEFAULT 0,
+            total_igst INTEGER DEFAULT 0,
             chk_sales INTEGER DEFAULT 0,
             chk_sales_time TIMESTAMP,
             chk_purchase INTEGER DEFAULT 0,
@@ -182,41 +387,41 @@ def init_db():
             month INTEGER NOT NULL,
             year INTEGER NOT NULL,
             status TEXT DEFAULT 'pending',
-            gstr1_tv REAL DEFAULT 0,
-            gstr1_cgst REAL DEFAULT 0,
-            gstr1_sgst REAL DEFAULT 0,
-            gstr1_igst REAL DEFAULT 0,
-            liability_tv REAL DEFAULT 0,
-            liability_cgst REAL DEFAULT 0,
-            liability_sgst REAL DEFAULT 0,
-            liability_igst REAL DEFAULT 0,
-            tv_2b REAL DEFAULT 0,
-            cgst_2b REAL DEFAULT 0,
-            sgst_2b REAL DEFAULT 0,
-            igst_2b REAL DEFAULT 0,
-            tv_tally REAL DEFAULT 0,
-            cgst_tally REAL DEFAULT 0,
-            sgst_tally REAL DEFAULT 0,
-            igst_tally REAL DEFAULT 0,
-            ineligible_cgst REAL DEFAULT 0,
-            ineligible_sgst REAL DEFAULT 0,
-            ineligible_igst REAL DEFAULT 0,
-            rcm_cgst REAL DEFAULT 0,
-            rcm_sgst REAL DEFAULT 0,
-            rcm_igst REAL DEFAULT 0,
-            eligible_cgst REAL DEFAULT 0,
-            eligible_sgst REAL DEFAULT 0,
-            eligible_igst REAL DEFAULT 0,
-            eligible_total REAL DEFAULT 0,
-            net_cgst REAL DEFAULT 0,
-            net_sgst REAL DEFAULT 0,
-            net_igst REAL DEFAULT 0,
-            net_total REAL DEFAULT 0,
-            interest_cgst REAL DEFAULT 0,
-            interest_sgst REAL DEFAULT 0,
-            interest_igst REAL DEFAULT 0,
-            late_fee REAL DEFAULT 0,
-            tv_variance REAL DEFAULT 0,
+            gstr1_tv INTEGER DEFAULT 0,
+            gstr1_cgst INTEGER DEFAULT 0,
+            gstr1_sgst INTEGER DEFAULT 0,
+            gstr1_igst INTEGER DEFAULT 0,
+            liability_tv INTEGER DEFAULT 0,
+            liability_cgst INTEGER DEFAULT 0,
+            liability_sgst INTEGER DEFAULT 0,
+            liability_igst INTEGER DEFAULT 0,
+            tv_2b INTEGER DEFAULT 0,
+            cgst_2b INTEGER DEFAULT 0,
+            sgst_2b INTEGER DEFAULT 0,
+            igst_2b INTEGER DEFAULT 0,
+            tv_tally INTEGER DEFAULT 0,
+            cgst_tally INTEGER DEFAULT 0,
+            sgst_tally INTEGER DEFAULT 0,
+            igst_tally INTEGER DEFAULT 0,
+            ineligible_cgst INTEGER DEFAULT 0,
+            ineligible_sgst INTEGER DEFAULT 0,
+            ineligible_igst INTEGER DEFAULT 0,
+            rcm_cgst INTEGER DEFAULT 0,
+            rcm_sgst INTEGER DEFAULT 0,
+            rcm_igst INTEGER DEFAULT 0,
+            eligible_cgst INTEGER DEFAULT 0,
+            eligible_sgst INTEGER DEFAULT 0,
+            eligible_igst INTEGER DEFAULT 0,
+            eligible_total INTEGER DEFAULT 0,
+            net_cgst INTEGER DEFAULT 0,
+            net_sgst INTEGER DEFAULT 0,
+            net_igst INTEGER DEFAULT 0,
+            net_total INTEGER DEFAULT 0,
+            interest_cgst INTEGER DEFAULT 0,
+            interest_sgst INTEGER DEFAULT 0,
+            interest_igst INTEGER DEFAULT 0,
+            late_fee INTEGER DEFAULT 0,
+            tv_variance INTEGER DEFAULT 0,
             preparer_id INTEGER,
             reviewer_id INTEGER,
             prepared_at TIMESTAMP,
@@ -228,6 +433,7 @@ def init_db():
             UNIQUE(client_id, month, year)
         )
     """)
+    migrate_money_to_paise(conn)
 
     # Activity Logs
     c.execute("""
@@ -242,6 +448,152 @@ def init_db():
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activity_user ON activity_logs (user_id, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activity_client_period ON activity_logs (client_id, year, month, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activity_period ON activity_logs (year, month, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activity_timestamp ON activity_logs (timestamp)")
+
+    # Daily activity counts - kept after the detail rows are rolled into archives
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS activity_daily_summary (
+            day TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, user_id, action)
+        )
+    """)
+
+    # Archived financial years
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS archived_periods (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fy TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Data versions - bumped by triggers on every write, keys the export cache.
+    # month=0/year=0 is the global row for client master changes.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            month INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (month, year)
+        )
+    """)
+    # Which clients changed in a period, and at which period version - lets the period
+    # state API send only changed clients. One row per (period, client), so it stays small.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS client_period_versions (
+            month INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            client_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (month, year, client_id)
+        ) WITHOUT ROWID
+    """)
+    for table in ('gstr1_records', 'gstr3b_records', 'client_assignments'):
+        for event, refs in (('INSERT', ('NEW',)), ('UPDATE', ('OLD', 'NEW')), ('DELETE', ('OLD',))):
+            bumps = "".join(f"""
+                INSERT INTO data_versions (month, year, version, updated_at)
+                VALUES ({ref}.month, {ref}.year, 1, CURRENT_TIMESTAMP)
+                ON CONFLICT(month, year) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+                INSERT INTO client_period_versions (month, year, client_id, version)
+                SELECT {ref}.month, {ref}.year, {ref}.client_id, version FROM data_versions
+                WHERE month = {ref}.month AND year = {ref}.year
+                ON CONFLICT(month, year, client_id) DO UPDATE SET version = excluded.version;"""
+                for ref in refs)
+            # Recreated on every schema upgrade so changes to the body take effect
+            c.execute(f"DROP TRIGGER IF EXISTS trg_{table}_{event.lower()}_version")
+            c.execute(f"""
+                CREATE TRIGGER trg_{table}_{event.lower()}_version
+                AFTER {event} ON {table}
+                BEGIN{bumps}
+                END
+            """)
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_clients_{event.lower()}_version
+            AFTER {event} ON clients
+            BEGIN
+                INSERT INTO data_versions (month, year, version, updated_at)
+                VALUES (0, 0, 1, CURRENT_TIMESTAMP)
+                ON CONFLICT(month, year) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            END
+        """)
+
+    # Client trends - one row per client per period with rolling sums and YoY deltas,
+    # maintained by refresh_client_trend() on save/lock so history is a single indexed read
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS client_trends (
+            client_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            total_sales INTEGER DEFAULT 0,
+            output_tax INTEGER DEFAULT 0,
+            net_liability INTEGER DEFAULT 0,
+            sales_variance INTEGER DEFAULT 0,
+            tv_variance INTEGER DEFAULT 0,
+            gstr1_status TEXT,
+            gstr3b_status TEXT,
+            sales_3m INTEGER DEFAULT 0,
+            sales_12m INTEGER DEFAULT 0,
+            tax_3m INTEGER DEFAULT 0,
+            tax_12m INTEGER DEFAULT 0,
+            liability_12m INTEGER DEFAULT 0,
+            sales_yoy INTEGER,
+            tax_yoy INTEGER,
+            liability_yoy INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (client_id, year, month)
+        ) WITHOUT ROWID
+    """)
+    rebuild_client_trends(conn)
+
+    # ITC ledger - per client per GSTR-3B period: credit brought forward, carried forward
+    # and cash payable. Kept current by recompute_itc_ledger() whenever a 3B changes
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS itc_ledger (
+            client_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            opening_cgst INTEGER DEFAULT 0,
+            opening_sgst INTEGER DEFAULT 0,
+            opening_igst INTEGER DEFAULT 0,
+            closing_cgst INTEGER DEFAULT 0,
+            closing_sgst INTEGER DEFAULT 0,
+            closing_igst INTEGER DEFAULT 0,
+            payable_cgst INTEGER DEFAULT 0,
+            payable_sgst INTEGER DEFAULT 0,
+            payable_igst INTEGER DEFAULT 0,
+            payable_total INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (client_id, year, month)
+        ) WITHOUT ROWID
+    """)
+    rebuild_itc_ledger(conn)
+
+    # Maintenance log - one row per maintenance task run with the file statistics after it,
+    # the history behind the admin database health page
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS maintenance_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ran_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            task TEXT NOT NULL,
+            duration_ms INTEGER,
+            result TEXT,
+            db_bytes INTEGER,
+            wal_bytes INTEGER,
+            page_count INTEGER,
+            freelist_count INTEGER,
+            fragmentation REAL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_log_task ON maintenance_log(task, ran_at)")
 
     # Default admin
     c.execute("SELECT * FROM users WHERE username = 'admin'")
@@ -250,9 +602,110 @@ def init_db():
         c.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
                  ('admin', admin_hash, 'admin'))
 
+    c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     conn.commit()
     conn.close()
 
+def backup_database(backup_path):
+    """Consistent online copy of the database (safe while other workers are writing)"""
+    src = get_db()
+    dst = sqlite3.connect(backup_path)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+def backup_shard(label=None):
+    """Backup of the current firm's database, at most one per label (default: this month)"""
+    label = label or datetime.now().strftime('%Y%m')
+    backup_name = os.path.join(firm_dir(BACKUP_DIR), f"gst_backup_{label}.db")
+    if not os.path.exists(backup_name) and os.path.exists(current_db_path()):
+        backup_database(backup_name)
+    return backup_name
+
+def archive_shard(fy):
+    """Copy the current firm's database to its FY archive file and record it"""
+    archive_db = os.path.join(firm_dir(ARCHIVE_DIR), f"gst_archive_{fy}.db")
+    backup_database(archive_db)
+    conn = get_db()
+    conn.execute("INSERT INTO archived_periods (fy, file_path) VALUES (?, ?)", (fy, archive_db))
+    conn.commit()
+    conn.close()
+    return archive_db
+
+def shard_metrics():
+    """Size and row counts for the current firm's database"""
+    conn = get_read_db()
+    metrics = {'db_bytes': os.path.getsize(current_db_path())}
+    for table in ('users', 'clients', 'gstr1_records', 'gstr3b_records', 'activity_logs'):
+        metrics[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return metrics
+
+def prepare_shard():
+    """Schema, journal mode and monthly backup for the current firm's database"""
+    init_db()
+
+    # WAL lets readers run alongside a writer across processes; the mode is stored in the file
+    conn = get_db()
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+
+    try:
+        backup_shard()
+    except Exception as e:
+        app.logger.error(f'Startup backup failed: {e}')
+
+    try:
+        roll_up_activity_logs()
+        prune_notifications()
+    except Exception as e:
+        app.logger.error(f'Startup housekeeping failed: {e}')
+
+def create_firm(firm, source=None):
+    """Create a new firm shard, optionally seeded from an existing single-firm database"""
+    if not is_valid_firm(firm):
+        raise ValueError(f"Invalid firm name '{firm}' (use lowercase letters, digits, - and _)")
+    if firm_exists(firm):
+        raise ValueError(f"Firm '{firm}' already exists")
+    os.makedirs(FIRMS_DIR, exist_ok=True)
+    if source:
+        src = sqlite3.connect(source)
+        dst = sqlite3.connect(firm_db_path(firm))
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+    with use_firm(firm):
+        prepare_shard()
+
+def run_startup_tasks():
+    """One-time server startup: prepare every firm's shard (in parallel in multi-firm mode).
+
+    Call once per server start, before any worker begins serving - never per worker.
+    """
+    for_each_firm(lambda firm: prepare_shard())
+    try:
+        build_static_assets()
+    except Exception as e:
+        app.logger.error(f'Static asset build failed: {e}')
+
+def checkpoint_shard():
+    conn = get_db()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+def run_shutdown_tasks():
+    """Flush each WAL into its main database file so a stopped server leaves consistent files"""
+    stop_maintenance_scheduler()
+    try:
+        for_each_firm(lambda firm: checkpoint_shard())
+        app.logger.info('Shutdown checkpoint complete')
+    except Exception as e:
+        app.logger.error(f'Shutdown checkpoint failed: {e}')
+
 def add_notification(user_id, title, message, type='info'):
     try:
         conn = get_db()
@@ -263,15 +716,49 @@ def add_notification(user_id, title, message, type='info'):
     except:
         pass
 
+def get_unread_count(conn, user_id):
+    row = conn.execute("SELECT unread FROM notification_counters WHERE user_id = ?", (user_id,)).fetchone()
+    return row['unread'] if row else 0
+
 def get_notifications(user_id):
     conn = get_db()
-    notifs = conn.execute("SELECT * FROM notifications WHERE user_id = ? ORDER BY created_at DESC LIMIT 10",
+    notifs = conn.execute("SELECT * FROM notifications WHERE user_id = ? ORDER BY id DESC LIMIT 10",
                          (user_id,)).fetchall()
-    unread = conn.execute("SELECT COUNT(*) FROM notifications WHERE user_id = ? AND is_read = 0",
-                         (user_id,)).fetchone()[0]
+    unread = get_unread_count(conn, user_id)
     conn.close()
     return notifs, unread
 
+def mark_notifications_read_upto(conn, user_id, up_to=None):
+    """Mark unread notifications read, only those with id <= up_to when given"""
+    if up_to:
+        cur = conn.execute("UPDATE notifications SET is_read=1 WHERE user_id=? AND is_read=0 AND id<=?",
+                           (user_id, up_to))
+    else:
+        cur = conn.execute("UPDATE notifications SET is_read=1 WHERE user_id=? AND is_read=0", (user_id,))
+    return cur.rowcount
+
+def prune_notifications(user_id=None, days=None, batch_size=1000):
+    """Delete read notifications older than the retention window, in bounded batches"""
+    days = NOTIFICATION_RETENTION_DAYS if days is None else days
+    cutoff = f"-{int(days)} days"
+    user_filter = "AND user_id = ?" if user_id is not None else ""
+    params = (cutoff,) + ((user_id,) if user_id is not None else ()) + (batch_size,)
+    conn = get_db()
+    deleted = 0
+    while True:
+        cur = conn.execute(f"""
+            DELETE FROM notifications WHERE id IN (
+                SELECT id FROM notifications
+                WHERE is_read = 1 AND created_at < datetime('now', ?) {user_filter}
+                LIMIT ?)
+        """, params)
+        conn.commit()
+        deleted += cur.rowcount
+        if cur.rowcount < batch_size:
+            break
+    conn.close()
+    return deleted
+
 def log_activity(user_id, action, details='', client_id=None, month=None, year=None):
     conn = get_db()
     conn.execute("INSERT INTO activity_logs (user_id, action, details, client_id, month, year) VALUES (?, ?, ?, ?, ?, ?)",
@@ -279,6 +766,1263 @@ def log_activity(user_id, action, details='', client_id=None, month=None, year=N
     conn.commit()
     conn.close()
 
+# ==================== AUDIT LOG ====================
+# activity_logs holds the last AUDIT_RETENTION_MONTHS months. Older months are
+# written to archive/audit/activity_<YYYY-MM>_<first id>-<last id>.jsonl.gz,
+# counted into activity_daily_summary, then deleted from the hot table.
+
+AUDIT_FILTERS = ('user_id', 'client_id', 'month', 'year', 'action')
+
+def roll_up_activity_logs(keep_months=None, max_months=12):
+    """Archive and summarize whole months older than the retention window, oldest first.
+
+    Each month is handled in one transaction and at most max_months are done per call.
+    Archive names carry the id range, so a run interrupted before its commit simply
+    rewrites the same file next time. Returns the archive files written.
+    """
+    keep_months = AUDIT_RETENTION_MONTHS if keep_months is None else keep_months
+    today = datetime.now()
+    first = today.year * 12 + today.month - 1 - keep_months
+    cutoff = f"{first // 12:04d}-{first % 12 + 1:02d}-01 00:00:00"
+
+    conn = get_db()
+    months = [row[0] for row in conn.execute("""
+        SELECT DISTINCT substr(timestamp, 1, 7) FROM activity_logs
+        WHERE timestamp < ? ORDER BY 1 LIMIT ?
+    """, (cutoff, max_months))]
+
+    written = []
+    for ym in months:
+        year, month = int(ym[:4]), int(ym[5:7])
+        start = f"{ym}-01 00:00:00"
+        end = f"{year + month // 12:04d}-{month % 12 + 1:02d}-01 00:00:00"
+
+        bounds = conn.execute("SELECT MIN(id), MAX(id) FROM activity_logs WHERE timestamp >= ? AND timestamp < ?",
+                              (start, end)).fetchone()
+        path = os.path.join(firm_dir(AUDIT_ARCHIVE_DIR), f"activity_{ym}_{bounds[0]}-{bounds[1]}.jsonl.gz")
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for row in conn.execute("SELECT * FROM activity_logs WHERE timestamp >= ? AND timestamp < ? ORDER BY id",
+                                    (start, end)):
+                f.write(json.dumps(dict(row)) + "\n")
+        os.replace(tmp_path, path)
+
+        conn.execute("""
+            INSERT INTO activity_daily_summary (day, user_id, action, count)
+            SELECT substr(timestamp, 1, 10), COALESCE(user_id, 0), action, COUNT(*)
+            FROM activity_logs WHERE timestamp >= ? AND timestamp < ?
+            GROUP BY 1, 2, 3
+            ON CONFLICT(day, user_id, action) DO UPDATE SET count = count + excluded.count
+        """, (start, end))
+        conn.execute("DELETE FROM activity_logs WHERE timestamp >= ? AND timestamp < ?", (start, end))
+        conn.commit()
+        written.append(path)
+
+    conn.close()
+    return written
+
+def list_audit_archives():
+    """Archived months, newest first, as [{'month': 'YYYY-MM', 'files': [...], 'bytes': n}]"""
+    archive_dir = firm_dir(AUDIT_ARCHIVE_DIR)
+    months = {}
+    for name in sorted(os.listdir(archive_dir)):
+        if name.startswith('activity_') and name.endswith('.jsonl.gz'):
+            entry = months.setdefault(name[9:16], {'month': name[9:16], 'files': [], 'bytes': 0})
+            entry['files'].append(name)
+            entry['bytes'] += os.path.getsize(os.path.join(archive_dir, name))
+    return sorted(months.values(), key=lambda m: m['month'], reverse=True)
+
+def query_activity(conn, filters, before=None, limit=AUDIT_PAGE_SIZE):
+    """One keyset page of activity, newest first. Returns (rows, next_cursor)."""
+    where, params = [], []
+    for field in AUDIT_FILTERS:
+        if filters.get(field) not in (None, ''):
+            where.append(f"a.{field} = ?")
+            params.append(filters[field])
+    if before:
+        where.append("a.id < ?")
+        params.append(before)
+    sql = """
+        SELECT a.*, u.username, c.client_name FROM activity_logs a
+        LEFT JOIN users u ON u.id = a.user_id
+        LEFT JOIN clients c ON c.id = a.client_id
+    """
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY a.id DESC LIMIT ?"
+    rows = [dict(r) for r in conn.execute(sql, params + [limit + 1])]
+    next_cursor = rows[limit - 1]['id'] if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def query_activity_archive(month, filters, before=None, limit=AUDIT_PAGE_SIZE):
+    """Same as query_activity but reads one archived month's files"""
+    archive_dir = firm_dir(AUDIT_ARCHIVE_DIR)
+    names = sorted((n for n in os.listdir(archive_dir)
+                    if n.startswith(f"activity_{month}_") and n.endswith('.jsonl.gz')), reverse=True)
+    rows = []
+    for name in names:
+        with gzip.open(os.path.join(archive_dir, name), 'rt', encoding='utf-8') as f:
+            matches = []
+            for line in f:
+                row = json.loads(line)
+                if before and row['id'] >= before:
+                    continue
+                if all(filters.get(k) in (None, '') or str(row.get(k)) == str(filters[k]) for k in AUDIT_FILTERS):
+                    matches.append(row)
+        rows.extend(reversed(matches))
+        if len(rows) > limit:
+            break
+    next_cursor = rows[limit - 1]['id'] if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+# ==================== CLIENT SEARCH ====================
+
+def search_clients(conn, q, limit=CLIENT_SEARCH_LIMIT, after=None, month=None, year=None):
+    """Active clients matching q in name or GSTIN, ordered by name, keyset paginated.
+
+    Queries of 3+ characters use the trigram index; shorter ones match by prefix.
+    after is the (client_name, id) of the last row already shown. With month/year
+    each row carries that period's preparer assignments. Returns (rows, next_cursor).
+    """
+    q = (q or '').strip()
+    where = ["c.status = 'active'"]
+    params = []
+    if after:
+        where.append("(c.client_name, c.id) > (?, ?)")
+        params.extend(after)
+
+    select = "SELECT c.id, c.client_name, c.gstin"
+    joins = ""
+    if month and year:
+        select += ", a.gstr1_preparer_id, a.gstr3b_preparer_id"
+        joins = " LEFT JOIN client_assignments a ON a.client_id = c.id AND a.month = ? AND a.year = ?"
+        params = [month, year] + params
+
+    def run(source, match_clause, match_params):
+        sql = (f"{select} FROM {source}{joins} WHERE {' AND '.join(where + [match_clause])}"
+               f" ORDER BY c.client_name, c.id LIMIT ?")
+        # join params come first, then keyset, then the match
+        return [dict(r) for r in conn.execute(sql, params + match_params + [limit + 1])]
+
+    escaped = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    like_clause = "(c.client_name LIKE ? ESCAPE '\\' OR c.gstin LIKE ? ESCAPE '\\')"
+    if len(q) >= 3:
+        try:
+            rows = run("clients_fts f JOIN clients c ON c.id = f.rowid", "clients_fts MATCH ?",
+                       ['"' + q.replace('"', '""') + '"'])
+        except sqlite3.OperationalError:
+            rows = run("clients c", like_clause, [f"%{escaped}%"] * 2)
+    elif q:
+        rows = run("clients c", like_clause, [f"{escaped}%"] * 2)
+    else:
+        rows = run("clients c", "1", [])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = {'name': rows[-1]['client_name'], 'id': rows[-1]['id']}
+    return rows, next_cursor
+
+# ==================== MONEY ====================
+# Amounts are stored as integer paise so sums are exact and totals are plain SQL SUM().
+# Rupees only exist at the boundary: request parsing, JSON responses and templates.
+
+MONEY_COLUMNS = {
+    'gstr1_records': ('b2b_sales', 'b2c_sales', 'credit_note', 'debit_note', 'sez_exempted', 'total_sales',
+                      'sales_as_per_tally', 'variance', 'total_cgst', 'total_sgst', 'total_igst'),
+    'gstr3b_records': ('gstr1_tv', 'gstr1_cgst', 'gstr1_sgst', 'gstr1_igst',
+                       'liability_tv', 'liability_cgst', 'liability_sgst', 'liability_igst',
+                       'tv_2b', 'cgst_2b', 'sgst_2b', 'igst_2b', 'tv_tally', 'cgst_tally', 'sgst_tally', 'igst_tally',
+                       'ineligible_cgst', 'ineligible_sgst', 'ineligible_igst', 'rcm_cgst', 'rcm_sgst', 'rcm_igst',
+                       'eligible_cgst', 'eligible_sgst', 'eligible_igst', 'eligible_total',
+                       'net_cgst', 'net_sgst', 'net_igst', 'net_total',
+                       'interest_cgst', 'interest_sgst', 'interest_igst', 'late_fee', 'tv_variance'),
+    'client_trends': ('total_sales', 'output_tax', 'net_liability', 'sales_variance', 'tv_variance',
+                      'sales_3m', 'sales_12m', 'tax_3m', 'tax_12m', 'liability_12m',
+                      'sales_yoy', 'tax_yoy', 'liability_yoy'),
+    'itc_ledger': ('opening_cgst', 'opening_sgst', 'opening_igst', 'closing_cgst', 'closing_sgst', 'closing_igst',
+                   'payable_cgst', 'payable_sgst', 'payable_igst', 'payable_total'),
+}
+
+MAX_RUPEES = Decimal(10) ** 15  # far above any return, and sums of such amounts still fit a 64-bit INTEGER
+
+def to_paise(value):
+    """'1,234.56', 1234.56 or None -> 123456, rounded half-up without float error"""
+    if value is None or value == '':
+        return 0
+    try:
+        amount = Decimal(str(value).replace(',', '').strip())
+    except InvalidOperation:
+        raise ValueError(f"invalid amount '{value}'")
+    if not amount.is_finite() or abs(amount) >= MAX_RUPEES:
+        raise ValueError(f"invalid amount '{value}'")
+    return int((amount * 100).to_integral_value(ROUND_HALF_UP))
+
+def to_rupees(paise):
+    return paise / 100 if paise is not None else None
+
+def rupee_fields(row, table):
+    """Row as a dict with its money columns in rupees, for templates and JSON"""
+    if row is None:
+        return None
+    row = dict(row)
+    for col in MONEY_COLUMNS[table]:
+        if col in row:
+            row[col] = to_rupees(row[col])
+    return row
+
+GSTR3B_INPUT_FIELDS = ('liability_tv', 'liability_cgst', 'liability_sgst', 'liability_igst',
+                       'tv_2b', 'cgst_2b', 'sgst_2b', 'igst_2b',
+                       'tv_tally', 'cgst_tally', 'sgst_tally', 'igst_tally',
+                       'ineligible_cgst', 'ineligible_sgst', 'ineligible_igst',
+                       'rcm_cgst', 'rcm_sgst', 'rcm_igst',
+                       'interest_cgst', 'interest_sgst', 'interest_igst', 'late_fee')
+
+def compute_gstr3b(values):
+    """Eligible ITC, net liability and TV variance in paise from the 3B inputs (plus gstr1_tv)"""
+    result = {}
+    for tax in ('cgst', 'sgst', 'igst'):
+        result[f'eligible_{tax}'] = values[f'{tax}_tally'] + values[f'rcm_{tax}'] - values[f'ineligible_{tax}']
+        result[f'net_{tax}'] = values[f'liability_{tax}'] - result[f'eligible_{tax}'] + values[f'interest_{tax}']
+    result['eligible_total'] = sum(result[f'eligible_{tax}'] for tax in ('cgst', 'sgst', 'igst'))
+    result['net_total'] = sum(result[f'net_{tax}'] for tax in ('cgst', 'sgst', 'igst')) + values['late_fee']
+    result['tv_variance'] = values['liability_tv'] - values['gstr1_tv']
+    return result
+
+def migrate_money_to_paise(conn):
+    """One-off rebuild of tables whose money columns are still REAL rupees.
+
+    SQLite cannot change a column type in place, so each table is copied into an
+    INTEGER-typed twin and swapped in. Triggers dropped with the old table are
+    recreated by init_db; client_trends is simply rebuilt. The old 3B save never
+    stored eligible_total/net_total (and took the rest from the browser), so the
+    computed 3B columns are recalculated from the inputs.
+    """
+    converted = []
+    for table in ('gstr1_records', 'gstr3b_records'):
+        columns = {col['name']: col['type'] for col in conn.execute(f"PRAGMA table_info({table})")}
+        money = [col for col in MONEY_COLUMNS[table] if columns.get(col, '').upper() == 'REAL']
+        if not money:
+            continue
+        create_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()[0]
+        create_sql = create_sql.replace(table, f"{table}_paise", 1)
+        for col in money:
+            create_sql = re.sub(rf"\b{col} REAL\b", f"{col} INTEGER", create_sql)
+        conn.execute(create_sql)
+        select = ", ".join(f"CAST(ROUND({col} * 100) AS INTEGER)" if col in money else col for col in columns)
+        conn.execute(f"INSERT INTO {table}_paise ({', '.join(columns)}) SELECT {select} FROM {table}")
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_paise RENAME TO {table}")
+        converted.append(table)
+        app.logger.info(f'Converted {table} amounts to integer paise')
+
+    if 'gstr3b_records' in converted:
+        inputs = GSTR3B_INPUT_FIELDS + ('gstr1_tv',)
+        updates = []
+        for row in conn.execute(f"SELECT id, {', '.join(inputs)} FROM gstr3b_records").fetchall():
+            result = compute_gstr3b({f: row[f] or 0 for f in inputs})
+            updates.append(list(result.values()) + [row['id']])
+        if updates:
+            conn.executemany("UPDATE gstr3b_records SET " + ", ".join(f"{f}=?" for f in result) + " WHERE id=?",
+                             updates)
+
+    trend_types = {col['name']: col['type'] for col in conn.execute("PRAGMA table_info(client_trends)")}
+    if trend_types.get('total_sales', '').upper() == 'REAL':
+        conn.execute("DROP TABLE client_trends")
+
+# ==================== CLIENT TRENDS ====================
+
+# Per-period figures for one client, from whichever of GSTR-1 / GSTR-3B exist
+TREND_SOURCE_SQL = """
+    SELECT k.client_id, k.year, k.month,
+           COALESCE(g1.total_sales, 0) AS total_sales,
+           COALESCE(g1.total_cgst + g1.total_sgst + g1.total_igst, 0) AS output_tax,
+           COALESCE(g3.net_cgst + g3.net_sgst + g3.net_igst, 0) AS net_liability,
+           COALESCE(g1.variance, 0) AS sales_variance,
+           COALESCE(g3.tv_variance, 0) AS tv_variance,
+           g1.status AS gstr1_status, g3.status AS gstr3b_status
+    FROM (SELECT client_id, month, year FROM gstr1_records {where}
+          UNION SELECT client_id, month, year FROM gstr3b_records {where}) k
+    LEFT JOIN gstr1_records g1 ON g1.client_id = k.client_id AND g1.month = k.month AND g1.year = k.year
+    LEFT JOIN gstr3b_records g3 ON g3.client_id = k.client_id AND g3.month = k.month AND g3.year = k.year
+"""
+TREND_BASE_FIELDS = ('total_sales', 'output_tax', 'net_liability', 'sales_variance', 'tv_variance',
+                     'gstr1_status', 'gstr3b_status')
+TREND_ROLLUP_FIELDS = ('sales_3m', 'sales_12m', 'tax_3m', 'tax_12m', 'liability_12m',
+                       'sales_yoy', 'tax_yoy', 'liability_yoy')
+
+def period_index(month, year):
+    return year * 12 + month - 1
+
+def update_trend_rollups(conn, client_id, base, targets):
+    """Recompute rolling sums and YoY deltas for the target periods.
+
+    base maps period_index -> trend row and must cover the 12 months before each target;
+    months with no record count as zero.
+    """
+    updates = []
+    for p in sorted(targets):
+        if p not in base:
+            continue
+        def window(months, field):
+            return sum(base[q][field] for q in range(p - months + 1, p + 1) if q in base)
+        def yoy(field):
+            prior = base.get(p - 12)
+            return base[p][field] - prior[field] if prior else None
+        year, month0 = divmod(p, 12)
+        updates.append((window(3, 'total_sales'), window(12, 'total_sales'),
+                        window(3, 'output_tax'), window(12, 'output_tax'), window(12, 'net_liability'),
+                        yoy('total_sales'), yoy('output_tax'), yoy('net_liability'),
+                        client_id, year, month0 + 1))
+    conn.executemany(f"""
+        UPDATE client_trends SET {', '.join(f'{f}=?' for f in TREND_ROLLUP_FIELDS)}, updated_at=CURRENT_TIMESTAMP
+        WHERE client_id=? AND year=? AND month=?
+    """, updates)
+
+def refresh_client_trend(conn, client_id, month, year):
+    """Bring one client's trend row up to date after its GSTR-1/3B for month/year changed.
+
+    Only that period and the 12 after it (whose rolling sums and YoY include it) are
+    touched. Runs on the caller's connection so it commits with the save itself.
+    """
+    row = conn.execute(TREND_SOURCE_SQL.format(where="WHERE client_id=? AND month=? AND year=?"),
+                       (client_id, month, year) * 2).fetchone()
+    if row:
+        conn.execute(f"""
+            INSERT INTO client_trends (client_id, year, month, {', '.join(TREND_BASE_FIELDS)})
+            VALUES (?, ?, ?, {', '.join('?' * len(TREND_BASE_FIELDS))})
+            ON CONFLICT(client_id, year, month) DO UPDATE SET
+                {', '.join(f'{f}=excluded.{f}' for f in TREND_BASE_FIELDS)}, updated_at=CURRENT_TIMESTAMP
+        """, [client_id, year, month] + [row[f] for f in TREND_BASE_FIELDS])
+    else:
+        conn.execute("DELETE FROM client_trends WHERE client_id=? AND year=? AND month=?",
+                     (client_id, year, month))
+
+    p = period_index(month, year)
+    lo, hi = divmod(p - 12, 12), divmod(p + 12, 12)
+    base = {period_index(r['month'], r['year']): r for r in conn.execute("""
+        SELECT * FROM client_trends WHERE client_id=? AND (year, month) BETWEEN (?, ?) AND (?, ?)
+    """, (client_id, lo[0], lo[1] + 1, hi[0], hi[1] + 1))}
+    update_trend_rollups(conn, client_id, base, range(p, p + 13))
+
+def refresh_record_trend(conn, table, record_id):
+    """refresh_client_trend() for a gstr1_records / gstr3b_records row id"""
+    record = conn.execute(f"SELECT client_id, month, year FROM {table} WHERE id=?", (record_id,)).fetchone()
+    if record:
+        refresh_client_trend(conn, record['client_id'], record['month'], record['year'])
+
+def rebuild_client_trends(conn):
+    """Recompute every trend row from the records (schema upgrades and repairs)"""
+    conn.execute("DELETE FROM client_trends")
+    conn.execute(f"""
+        INSERT INTO client_trends (client_id, year, month, {', '.join(TREND_BASE_FIELDS)})
+        SELECT client_id, year, month, {', '.join(TREND_BASE_FIELDS)} FROM ({TREND_SOURCE_SQL.format(where='')})
+    """)
+    client_id, base = None, {}
+    for r in conn.execute("SELECT * FROM client_trends ORDER BY client_id, year, month").fetchall():
+        if r['client_id'] != client_id:
+            if base:
+                update_trend_rollups(conn, client_id, base, base.keys())
+            client_id, base = r['client_id'], {}
+        base[period_index(r['month'], r['year'])] = r
+    if base:
+        update_trend_rollups(conn, client_id, base, base.keys())
+
+def get_client_trend(conn, client_id, start=None, end=None):
+    """Trend rows for one client in rupees, oldest first; start/end are (month, year) bounds"""
+    start, end = start or (1, 0), end or (12, 9999)
+    rows = conn.execute("""
+        SELECT * FROM client_trends
+        WHERE client_id=? AND (year, month) BETWEEN (?, ?) AND (?, ?)
+        ORDER BY year, month
+    """, (client_id, start[1], start[0], end[1], end[0])).fetchall()
+    return [rupee_fields(r, 'client_trends') for r in rows]
+
+# ==================== ITC LEDGER ====================
+# Each client's GSTR-3B periods form a chain: a period opens with the ITC the
+# previous period carried forward, sets credit off against its liability head by
+# head, and carries the rest on. A filed (locked) period keeps the ledger row it was
+# filed with, so recomputes never rewrite it and continue from its closing balance.
+
+ITC_LEDGER_FIELDS = MONEY_COLUMNS['itc_ledger']
+
+ITC_SOURCE_SQL = """
+    SELECT g3.client_id, g3.year, g3.month, g3.status, g3.late_fee,
+           g3.liability_cgst, g3.liability_sgst, g3.liability_igst,
+           g3.eligible_cgst, g3.eligible_sgst, g3.eligible_igst,
+           g3.interest_cgst, g3.interest_sgst, g3.interest_igst,
+           l.client_id IS NOT NULL AS in_ledger,
+           l.opening_cgst AS old_opening_cgst, l.opening_sgst AS old_opening_sgst, l.opening_igst AS old_opening_igst,
+           l.closing_cgst AS old_closing_cgst, l.closing_sgst AS old_closing_sgst, l.closing_igst AS old_closing_igst
+    FROM gstr3b_records g3
+    LEFT JOIN itc_ledger l ON l.client_id = g3.client_id AND l.year = g3.year AND l.month = g3.month
+"""
+
+def itc_ledger_entry(record, opening):
+    """Ledger row for one GSTR-3B given the opening credit per head, in paise.
+
+    Credit (opening + this month's eligible ITC) is set off against the liability of
+    the same head; a negative balance (reversal) is paid in cash. Interest and late
+    fee are always cash.
+    """
+    entry = {'client_id': record['client_id'], 'year': record['year'], 'month': record['month']}
+    entry['payable_total'] = record['late_fee']
+    for tax in ('cgst', 'sgst', 'igst'):
+        available = opening[tax] + record[f'eligible_{tax}']
+        set_off = max(min(record[f'liability_{tax}'], available), 0)
+        entry[f'opening_{tax}'] = opening[tax]
+        entry[f'closing_{tax}'] = max(available, 0) - set_off
+        entry[f'payable_{tax}'] = (record[f'liability_{tax}'] - set_off + max(-available, 0)
+                                   + record[f'interest_{tax}'])
+        entry['payable_total'] += entry[f'payable_{tax}']
+    return entry
+
+def save_itc_entries(conn, entries):
+    columns = ('client_id', 'year', 'month') + ITC_LEDGER_FIELDS
+    conn.executemany(f"""
+        INSERT INTO itc_ledger ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+        ON CONFLICT(client_id, year, month) DO UPDATE SET
+            {', '.join(f'{f} = excluded.{f}' for f in ITC_LEDGER_FIELDS)}, updated_at = CURRENT_TIMESTAMP
+    """, [[e[c] for c in columns] for e in entries])
+
+def recompute_itc_ledger(conn, client_id, month, year):
+    """Bring the client's ledger up to date after the GSTR-3B for (month, year) changed.
+
+    Walks forward from that period and stops at the first later period whose stored
+    opening balance is already right (nothing after it can change) or at a filed
+    period. Returns the number of ledger rows written; the caller commits.
+    """
+    prev = conn.execute("""
+        SELECT closing_cgst, closing_sgst, closing_igst FROM itc_ledger
+        WHERE client_id = ? AND (year, month) < (?, ?) ORDER BY year DESC, month DESC LIMIT 1
+    """, (client_id, year, month)).fetchone()
+    opening = {tax: prev[f'closing_{tax}'] if prev else 0 for tax in ('cgst', 'sgst', 'igst')}
+    rows = conn.execute(ITC_SOURCE_SQL + """
+        WHERE g3.client_id = ? AND (g3.year, g3.month) >= (?, ?) ORDER BY g3.year, g3.month
+    """, (client_id, year, month)).fetchall()
+
+    entries = []
+    for row in rows:
+        if row['in_ledger']:
+            if row['status'] == 'locked':
+                break
+            if entries and all(row[f'old_opening_{tax}'] == opening[tax] for tax in opening):
+                break
+        entry = itc_ledger_entry(row, opening)
+        entries.append(entry)
+        opening = {tax: entry[f'closing_{tax}'] for tax in opening}
+    save_itc_entries(conn, entries)
+    return len(entries)
+
+def rebuild_itc_ledger(conn, client_id=None):
+    """Recompute the whole ledger (or one client's) in a single ordered pass; the caller commits.
+
+    Filed periods that already have a ledger row are kept as anchors and the chain
+    continues from their closing balance. Returns the number of rows written.
+    """
+    where, params = ("WHERE g3.client_id = ?", (client_id,)) if client_id else ("", ())
+    entries, current, opening = [], None, None
+    for row in conn.execute(f"{ITC_SOURCE_SQL} {where} ORDER BY g3.client_id, g3.year, g3.month", params):
+        if row['client_id'] != current:
+            current, opening = row['client_id'], {'cgst': 0, 'sgst': 0, 'igst': 0}
+        if row['in_ledger'] and row['status'] == 'locked':
+            opening = {tax: row[f'old_closing_{tax}'] for tax in opening}
+            continue
+        entry = itc_ledger_entry(row, opening)
+        entries.append(entry)
+        opening = {tax: entry[f'closing_{tax}'] for tax in opening}
+    save_itc_entries(conn, entries)
+    conn.execute("""
+        DELETE FROM itc_ledger WHERE NOT EXISTS (
+            SELECT 1 FROM gstr3b_records g3
+            WHERE g3.client_id = itc_ledger.client_id AND g3.year = itc_ledger.year AND g3.month = itc_ledger.month)
+    """)
+    return len(entries)
+
+# ==================== BULK FILING ====================
+
+FILING_TABLES = {'gstr1': 'gstr1_records', 'gstr3b': 'gstr3b_records'}
+FILING_COLUMNS = ('gstin', 'period', 'return_type', 'arn', 'filed_date')
+
+def parse_filing_upload(filename, data):
+    """Rows from a portal CSV or a JSON list; headers are matched case-insensitively"""
+    if filename.lower().endswith('.json'):
+        rows = json.loads(data)
+        rows = rows.get('rows', []) if isinstance(rows, dict) else rows
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError('expected a list of row objects')
+    else:
+        rows = list(csv.DictReader(io.StringIO(data.decode('utf-8-sig') if isinstance(data, bytes) else data)))
+    normalised = []
+    for row in rows:
+        row = {str(k).strip().lower().replace(' ', '_').replace('-', '_'): v for k, v in row.items() if k}
+        normalised.append({col: str(row.get(col) or '').strip() for col in FILING_COLUMNS})
+    return normalised
+
+def parse_return_period(value):
+    """'04-2024', '2024-04' or the portal's '042024' -> (month, year)"""
+    digits = re.sub(r'\D', '', value)
+    if len(digits) != 6:
+        raise ValueError(f"invalid period '{value}'")
+    month, year = (int(digits[4:]), int(digits[:4])) if re.match(r'^\d{4}\D', value) else (int(digits[:2]), int(digits[2:]))
+    if not 1 <= month <= 12:
+        raise ValueError(f"invalid period '{value}'")
+    return month, year
+
+def parse_filed_date(value):
+    if not value:
+        return datetime.now()
+    for fmt in ('%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"invalid filed date '{value}'")
+
+def bulk_file_returns(conn, rows, dry_run=False):
+    """Validate every row, then lock all matched GSTR-1/3B records in one transaction.
+
+    Clients are resolved through an in-memory GSTIN index and records by their
+    (client_id, month, year) key. If any row fails nothing is written. Returns
+    (report, ok) where report has one entry per input row.
+    """
+    gstin_index = {}
+    for client in conn.execute("SELECT id, gstin FROM clients WHERE gstin IS NOT NULL AND gstin != ''"):
+        gstin_index.setdefault(client['gstin'].strip().upper(), []).append(client['id'])
+
+    report, updates, seen = [], {table: [] for table in FILING_TABLES.values()}, {}
+    for line, row in enumerate(rows, start=1):
+        result = {'row': line, 'gstin': row['gstin'], 'period': row['period'],
+                  'return_type': row['return_type'], 'arn': row['arn'], 'status': 'error'}
+        report.append(result)
+        try:
+            return_type = re.sub(r'[^a-z0-9]', '', row['return_type'].lower())
+            if return_type not in FILING_TABLES:
+                raise ValueError(f"unknown return type '{row['return_type']}'")
+            table = FILING_TABLES[return_type]
+            client_ids = gstin_index.get(row['gstin'].upper(), [])
+            if not client_ids:
+                raise ValueError('GSTIN not found')
+            if len(client_ids) > 1:
+                raise ValueError('GSTIN belongs to more than one client')
+            month, year = parse_return_period(row['period'])
+            filed_at = parse_filed_date(row['filed_date'])
+            if not row['arn']:
+                raise ValueError('ARN missing')
+
+            record = conn.execute(f"SELECT id, status, arn_number FROM {table} WHERE client_id=? AND month=? AND year=?",
+                                  (client_ids[0], month, year)).fetchone()
+            if not record:
+                raise ValueError(f"no {return_type.upper()} record for {month:02d}-{year}")
+            if (table, record['id']) in seen:
+                raise ValueError(f"duplicate of row {seen[(table, record['id'])]}")
+            seen[(table, record['id'])] = line
+            if record['status'] == 'locked':
+                if record['arn_number'] == row['arn']:
+                    result.update(status='unchanged', message='already filed with this ARN')
+                    continue
+                raise ValueError(f"already filed with ARN {record['arn_number']}")
+
+            updates[table].append((row['arn'], filed_at, filed_at, record['id']))
+            result.update(status='filed', client_id=client_ids[0], month=month, year=year)
+        except ValueError as e:
+            result['message'] = str(e)
+
+    ok = all(r['status'] != 'error' for r in report)
+    if ok and not dry_run:
+        for table, params in updates.items():
+            conn.executemany(f"UPDATE {table} SET status='locked', arn_number=?, filed_at=?, locked_at=? WHERE id=?",
+                             params)
+        for r in report:
+            if r['status'] == 'filed':
+                refresh_client_trend(conn, r['client_id'], r['month'], r['year'])
+        conn.commit()
+    elif not ok:
+        conn.rollback()
+    return report, ok
+
+# ==================== INTEREST & LATE FEE ====================
+# GSTR-3B filed (or still unfiled) after its due date owes interest at 18% p.a. on
+# the tax paid in cash (liability less ITC brought forward and eligible this month)
+# for each day late, and a late fee per day capped by the client's turnover in the
+# preceding FY. Amounts are paise.
+
+INTEREST_RATE_PERCENT = 18
+LATE_FEE_PER_DAY = 5000  # Rs 25 CGST + Rs 25 SGST
+LATE_FEE_PER_DAY_NIL = 2000  # Rs 10 + Rs 10 for a nil return
+LATE_FEE_CAP_NIL = 50000
+LATE_FEE_CAPS = ((15000000 * 100, 200000),  # preceding-FY turnover up to Rs 1.5 crore: Rs 2,000
+                 (50000000 * 100, 500000),  # up to Rs 5 crore: Rs 5,000
+                 (None, 1000000))           # above, or turnover unknown: Rs 10,000
+LATE_CHARGE_FIELDS = ('interest_cgst', 'interest_sgst', 'interest_igst', 'late_fee')
+
+def round_to_rupee(numerator, denominator):
+    """numerator/denominator paise rounded half-up to whole rupees, as paise"""
+    return (2 * numerator + 100 * denominator) // (200 * denominator) * 100
+
+def late_fee_cap(turnover, nil):
+    if nil:
+        return LATE_FEE_CAP_NIL
+    for limit, cap in LATE_FEE_CAPS:
+        if limit is None or (turnover is not None and turnover <= limit):
+            return cap
+
+def calculate_late_charges(conn, periods, as_of=None):
+    """Interest and late fee for every GSTR-3B in periods filed, or still unfiled on as_of, after its due date.
+
+    A single query returns each late return with its days late, the ITC brought forward
+    from the ledger and the client's preceding-FY sales (client_trends sales_12m at
+    March) as the turnover for the cap.
+    Returns row dicts in paise with the new charges, the recomputed net figures and
+    the currently entered charges; locked returns are included but marked locked.
+    """
+    as_of = (as_of or datetime.now()).strftime('%Y-%m-%d')
+    due = ", ".join(["(?, ?, ?)"] * len(periods))
+    params = [v for m, y in periods for v in (m, y, get_due_date(m, y, 'gstr3b').strftime('%Y-%m-%d'))]
+    rows = conn.execute(f"""
+        WITH due(month, year, due_date) AS (VALUES {due})
+        SELECT g3.*, c.client_name, c.gstin, due.due_date, t.sales_12m AS prior_turnover,
+               COALESCE(l.opening_cgst, 0) AS opening_cgst, COALESCE(l.opening_sgst, 0) AS opening_sgst,
+               COALESCE(l.opening_igst, 0) AS opening_igst,
+               CAST(julianday(date(COALESCE(CASE WHEN g3.status = 'locked' THEN COALESCE(g3.filed_at, g3.locked_at) END, ?)))
+                    - julianday(due.due_date) AS INTEGER) AS days_late
+        FROM gstr3b_records g3
+        JOIN due ON due.month = g3.month AND due.year = g3.year
+        JOIN clients c ON c.id = g3.client_id
+        LEFT JOIN client_trends t ON t.client_id = g3.client_id AND t.month = 3
+             AND t.year = CASE WHEN g3.month >= 4 THEN g3.year ELSE g3.year - 1 END
+        LEFT JOIN itc_ledger l ON l.client_id = g3.client_id AND l.year = g3.year AND l.month = g3.month
+        WHERE days_late > 0
+        ORDER BY g3.year, g3.month, c.client_name
+    """, params + [as_of]).fetchall()
+
+    results = []
+    for row in rows:
+        values = {f: row[f] for f in GSTR3B_INPUT_FIELDS}
+        values['gstr1_tv'] = row['gstr1_tv']
+        days = row['days_late']
+        for tax in ('cgst', 'sgst', 'igst'):
+            credit = max(row[f'opening_{tax}'] + row[f'eligible_{tax}'], 0)
+            cash = max(row[f'liability_{tax}'] - credit, 0)
+            values[f'interest_{tax}'] = round_to_rupee(cash * INTEREST_RATE_PERCENT * days, 100 * 365)
+        nil = not any(row[f] for f in ('liability_tv', 'liability_cgst', 'liability_sgst', 'liability_igst'))
+        per_day = LATE_FEE_PER_DAY_NIL if nil else LATE_FEE_PER_DAY
+        values['late_fee'] = min(per_day * days, late_fee_cap(row['prior_turnover'], nil))
+
+        result = {f: row[f] for f in ('id', 'client_id', 'client_name', 'gstin', 'month', 'year',
+                                      'status', 'due_date', 'days_late')}
+        result.update({f: values[f] for f in LATE_CHARGE_FIELDS})
+        result.update(compute_gstr3b(values))
+        result['entered'] = {f: row[f] for f in LATE_CHARGE_FIELDS}
+        result['changed'] = any(row[f] != values[f] for f in LATE_CHARGE_FIELDS)
+        result['locked'] = row['status'] == 'locked'
+        results.append(result)
+    return results
+
+def apply_late_charges(conn, results):
+    """Write calculated charges to every changed, unlocked return in one transaction; returns the count"""
+    updates = [r for r in results if r['changed'] and not r['locked']]
+    columns = LATE_CHARGE_FIELDS + ('eligible_cgst', 'eligible_sgst', 'eligible_igst', 'eligible_total',
+                                    'net_cgst', 'net_sgst', 'net_igst', 'net_total')
+    conn.executemany(
+        "UPDATE gstr3b_records SET " + ", ".join(f"{c}=?" for c in columns) + " WHERE id=? AND status != 'locked'",
+        [[r[c] for c in columns] + [r['id']] for r in updates])
+    earliest = {}
+    for r in updates:
+        refresh_client_trend(conn, r['client_id'], r['month'], r['year'])
+        earliest.setdefault(r['client_id'], (r['month'], r['year']))  # results are in period order
+    for client_id, (month, year) in earliest.items():
+        recompute_itc_ledger(conn, client_id, month, year)
+    conn.commit()
+    return len(updates)
+
+# ==================== PERIOD STATE ====================
+
+PERIOD_STATE_COLUMNS = {
+    'client_id': 'c.id',
+    'client_name': 'c.client_name',
+    'gstin': 'c.gstin',
+    'gstr1_status': 'g1.status',
+    'gstr1_arn': 'g1.arn_number',
+    'gstr1_preparer_id': 'a.gstr1_preparer_id',
+    'gstr3b_status': 'g3.status',
+    'gstr3b_arn': 'g3.arn_number',
+    'gstr3b_preparer_id': 'a.gstr3b_preparer_id',
+    'total_sales': 'g1.total_sales',
+    'output_tax': 'g1.total_cgst + g1.total_sgst + g1.total_igst',
+    'net_liability': 'g3.net_total',
+}
+PERIOD_STATE_MONEY = ('total_sales', 'output_tax', 'net_liability')
+PERIOD_STATE_FIELDS = tuple(PERIOD_STATE_COLUMNS) + ('gstr1_due', 'gstr3b_due')
+
+def period_state_version(conn, month, year):
+    """'<period version>.<client master version>.<day>' - due colours change with the date"""
+    versions = {(r['month'], r['year']): r['version'] for r in conn.execute(
+        "SELECT month, year, version FROM data_versions WHERE (month, year) IN (VALUES (?, ?), (0, 0))",
+        (month, year))}
+    return f"{versions.get((month, year), 0)}.{versions.get((0, 0), 0)}.{datetime.now():%Y%m%d}"
+
+def get_period_state(conn, month, year, fields=None, since=None, preparer_id=None):
+    """Every active client's state for one period as columns: {field: [values...]}.
+
+    fields projects the output (client_id is always included). since is a version
+    from an earlier response; when only this period's records changed since then,
+    just the changed clients are returned ('delta': True). preparer_id limits rows
+    to clients assigned to that preparer; in a delta, changed clients no longer
+    assigned to them are listed in 'removed'. Amounts are in rupees.
+    """
+    fields = ['client_id'] + [f for f in (fields or PERIOD_STATE_FIELDS) if f in PERIOD_STATE_FIELDS and f != 'client_id']
+    version = period_state_version(conn, month, year)
+
+    where, params = ["c.status = 'active'"], [month, year] * 3
+    delta = False
+    if since:
+        since_period, _, since_rest = since.partition('.')
+        current_period, _, current_rest = version.partition('.')
+        if since_rest == current_rest and since_period.isdigit() and int(since_period) <= int(current_period):
+            delta = True
+            where.append("c.id IN (SELECT client_id FROM client_period_versions WHERE month=? AND year=? AND version>?)")
+            params += [month, year, int(since_period)]
+    if preparer_id:
+        where.append("(a.gstr1_preparer_id = ? OR a.gstr3b_preparer_id = ?)")
+        params += [preparer_id, preparer_id]
+
+    select = ", ".join(f"{expr} AS {name}" for name, expr in PERIOD_STATE_COLUMNS.items())
+    rows = conn.execute(f"""
+        SELECT {select} FROM clients c
+        LEFT JOIN gstr1_records g1 ON g1.client_id = c.id AND g1.month = ? AND g1.year = ?
+        LEFT JOIN gstr3b_records g3 ON g3.client_id = c.id AND g3.month = ? AND g3.year = ?
+        LEFT JOIN client_assignments a ON a.client_id = c.id AND a.month = ? AND a.year = ?
+        WHERE {' AND '.join(where)}
+        ORDER BY c.client_name, c.id
+    """, params).fetchall()
+
+    removed = []
+    if delta and preparer_id:
+        returned = {row['client_id'] for row in rows}
+        removed = [r['client_id'] for r in conn.execute(
+            "SELECT client_id FROM client_period_versions WHERE month=? AND year=? AND version>?",
+            (month, year, int(since_period))) if r['client_id'] not in returned]
+
+    columns = {f: [] for f in fields}
+    for row in rows:
+        for f in fields:
+            if f == 'gstr1_due':
+                value = get_due_status_color(month, year, row['gstr1_status'], 'gstr1')
+            elif f == 'gstr3b_due':
+                value = get_due_status_color(month, year, row['gstr3b_status'], 'gstr3b')
+            elif f in PERIOD_STATE_MONEY:
+                value = to_rupees(row[f])
+            else:
+                value = row[f]
+            columns[f].append(value)
+    return {'month': month, 'year': year, 'version': version, 'delta': delta,
+            'count': len(rows), 'fields': fields, 'columns': columns, 'removed': removed}
+
+# ==================== DATABASE MAINTENANCE ====================
+# Autosave rewrites and FY archiving leave free pages behind and the planner's
+# statistics drift as tables grow. run_maintenance() does one pass of small,
+# bounded steps; the scheduler thread runs it during MAINTENANCE_HOURS when no
+# GST data has been written for a while. Every step is logged to maintenance_log.
+
+MAINTENANCE_DAILY_TASKS = ('activity_rollup', 'analyze', 'quick_check')
+_maintenance_stop = threading.Event()
+_maintenance_thread = None
+
+def database_stats(conn, fragmentation=False):
+    """File size, WAL size, page and free-page counts of the current database.
+
+    With fragmentation=True also the share of b-tree pages not stored right after the
+    previous page of the same table/index. That reads every page through dbstat, so
+    it is measured once per maintenance pass; otherwise (or without dbstat) it is None.
+    """
+    db_path = current_db_path()
+    wal_path = f"{db_path}-wal"
+    stats = {
+        'db_bytes': os.path.getsize(db_path),
+        'wal_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        'page_size': conn.execute("PRAGMA page_size").fetchone()[0],
+        'page_count': conn.execute("PRAGMA page_count").fetchone()[0],
+        'freelist_count': conn.execute("PRAGMA freelist_count").fetchone()[0],
+        'auto_vacuum': ('none', 'full', 'incremental')[conn.execute("PRAGMA auto_vacuum").fetchone()[0]],
+        'fragmentation': None,
+    }
+    if not fragmentation:
+        return stats
+    try:
+        row = conn.execute("""
+            SELECT COUNT(*), SUM(prev IS NOT NULL AND pageno != prev + 1) FROM (
+                SELECT pageno, LAG(pageno) OVER (PARTITION BY name ORDER BY path) AS prev FROM dbstat
+            )
+        """).fetchone()
+        stats['fragmentation'] = round(row[1] / row[0], 4) if row[0] else 0.0
+    except sqlite3.OperationalError:
+        pass
+    return stats
+
+def log_maintenance(conn, task, started, result, fragmentation=False):
+    stats = database_stats(conn, fragmentation)
+    conn.execute("""
+        INSERT INTO maintenance_log (task, duration_ms, result, db_bytes, wal_bytes, page_count, freelist_count, fragmentation)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (task, int((time.monotonic() - started) * 1000), result, stats['db_bytes'], stats['wal_bytes'],
+          stats['page_count'], stats['freelist_count'], stats['fragmentation']))
+    conn.commit()
+
+def database_idle(conn, minutes=None):
+    """True when no GST data has been written in the last `minutes`"""
+    minutes = MAINTENANCE_IDLE_MINUTES if minutes is None else minutes
+    return conn.execute("SELECT COUNT(*) FROM data_versions WHERE updated_at > datetime('now', ?)",
+                        (f"-{int(minutes)} minutes",)).fetchone()[0] == 0
+
+def run_maintenance(force=False):
+    """One maintenance pass over the current firm's database; returns the tasks that ran.
+
+    The activity log rollup, analyze and quick_check run at most once a day
+    (fragmentation is measured with analyze), incremental vacuum frees at most MAINTENANCE_VACUUM_PAGES pages and the
+    WAL is checkpointed. Unless force is set the
+    pass is skipped while the database is in use.
+    """
+    conn = get_db()
+    done = []
+    try:
+        if not force and not database_idle(conn):
+            return done
+        recent = {row['task'] for row in conn.execute(
+            "SELECT DISTINCT task FROM maintenance_log WHERE ran_at > datetime('now', '-20 hours')")}
+
+        if force or 'activity_rollup' not in recent:
+            # Retention for a server that stays up for months; startup runs it too
+            started = time.monotonic()
+            written = roll_up_activity_logs()
+            log_maintenance(conn, 'activity_rollup', started, f"{len(written)} months archived")
+            done.append('activity_rollup')
+
+        if force or 'analyze' not in recent:
+            started = time.monotonic()
+            conn.execute(f"PRAGMA analysis_limit = {MAINTENANCE_ANALYSIS_LIMIT}")
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA optimize")
+            conn.execute("DELETE FROM maintenance_log WHERE ran_at < datetime('now', ?)",
+                         (f"-{MAINTENANCE_HISTORY_DAYS} days",))
+            log_maintenance(conn, 'analyze', started, 'ok', fragmentation=True)
+            done.append('analyze')
+
+        if force or 'quick_check' not in recent:
+            started = time.monotonic()
+            problems = [row[0] for row in conn.execute("PRAGMA quick_check(10)")]
+            result = 'ok' if problems == ['ok'] else '; '.join(problems)
+            if result != 'ok':
+                app.logger.error(f'Database quick_check failed: {result}')
+            log_maintenance(conn, 'quick_check', started, result)
+            done.append('quick_check')
+
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if auto_vacuum == 0 and os.path.getsize(current_db_path()) <= MAINTENANCE_CONVERT_MAX_BYTES:
+            # auto_vacuum can only be switched on for an existing file by a full VACUUM, done once
+            started = time.monotonic()
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            log_maintenance(conn, 'vacuum', started, 'auto_vacuum enabled')
+            done.append('vacuum')
+        elif auto_vacuum == 2 and conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+            started = time.monotonic()
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # executescript steps the pragma to completion; execute() would free a single page
+            conn.executescript(f"PRAGMA incremental_vacuum({MAINTENANCE_VACUUM_PAGES})")
+            freed = before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            log_maintenance(conn, 'incremental_vacuum', started, f"{freed} pages freed")
+            done.append('incremental_vacuum')
+
+        started = time.monotonic()
+        busy, wal_pages, moved = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        log_maintenance(conn, 'checkpoint', started,
+                        'busy' if busy else f"{moved}/{wal_pages} pages" if wal_pages >= 0 else 'not in WAL mode')
+        done.append('checkpoint')
+    finally:
+        conn.close()
+    return done
+
+def get_maintenance_history(conn, days=30):
+    """Last statistics row per day for the past `days` days plus the latest run of each task"""
+    history = conn.execute("""
+        SELECT date(ran_at) AS day, db_bytes, wal_bytes, page_count, freelist_count,
+               (SELECT f.fragmentation FROM maintenance_log f
+                WHERE date(f.ran_at) = date(m.ran_at) AND f.fragmentation IS NOT NULL
+                ORDER BY f.id DESC LIMIT 1) AS fragmentation
+        FROM maintenance_log m WHERE id IN (
+            SELECT MAX(id) FROM maintenance_log WHERE ran_at > datetime('now', ?) GROUP BY date(ran_at))
+        ORDER BY id DESC
+    """, (f"-{int(days)} days",)).fetchall()
+    last_runs = conn.execute("""
+        SELECT task, ran_at, duration_ms, result FROM maintenance_log
+        WHERE id IN (SELECT MAX(id) FROM maintenance_log GROUP BY task)
+        ORDER BY task
+    """).fetchall()
+    return history, last_runs
+
+def last_fragmentation(conn):
+    """(fragmentation, ran_at) from the latest pass that measured it, or (None, None)"""
+    row = conn.execute("""
+        SELECT fragmentation, ran_at FROM maintenance_log
+        WHERE fragmentation IS NOT NULL ORDER BY id DESC LIMIT 1
+    """).fetchone()
+    return (row['fragmentation'], row['ran_at']) if row else (None, None)
+
+def in_maintenance_window(now=None):
+    start, end = MAINTENANCE_HOURS
+    hour = (now or datetime.now()).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+def maintenance_scheduler():
+    while not _maintenance_stop.wait(MAINTENANCE_INTERVAL):
+        if not in_maintenance_window():
+            continue
+        try:
+            results = for_each_firm(lambda firm: run_maintenance())
+        except Exception as e:
+            results = {None: e}
+        for firm, result in results.items():
+            if isinstance(result, Exception):
+                app.logger.error(f'Maintenance failed for {firm or "database"}: {result}')
+            elif result:
+                app.logger.info(f'Maintenance {firm or "database"}: {", ".join(result)}')
+
+def start_maintenance_scheduler():
+    """Start the background maintenance thread - once per server, in the process that stays up"""
+    global _maintenance_thread
+    if _maintenance_thread is None or not _maintenance_thread.is_alive():
+        _maintenance_stop.clear()
+        _maintenance_thread = threading.Thread(target=maintenance_scheduler, name='gstpro-maintenance', daemon=True)
+        _maintenance_thread.start()
+
+def stop_maintenance_scheduler():
+    _maintenance_stop.set()
+
+# ==================== EXPORT CACHE ====================
+
+EXPORT_CACHE_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'html': 'text/html',
+}
+
+def get_data_version(conn, periods):
+    """Return (version_tag, last_modified) for a list of (month, year) periods, including client master changes"""
+    wanted = [(0, 0)] + list(periods)
+    where = " OR ".join(["(month = ? AND year = ?)"] * len(wanted))
+    params = [v for period in wanted for v in period]
+    rows = conn.execute(f"SELECT month, year, version, updated_at FROM data_versions WHERE {where}",
+                        params).fetchall()
+    versions = {(row['month'], row['year']): row['version'] for row in rows}
+    last_modified = None
+    for row in rows:
+        stamp = datetime.strptime(row['updated_at'], '%Y-%m-%d %H:%M:%S')
+        if last_modified is None or stamp > last_modified:
+            last_modified = stamp
+    period_tag = ".".join(str(versions.get(p, 0)) for p in periods)
+    return f"p{period_tag}-c{versions.get((0, 0), 0)}", last_modified
+
+def export_cache_key(view, month, year, version_tag):
+    """Content-addressed key: same view, period and data version always yield the same artifact"""
+    raw = f"{view}|{month}|{year}|{version_tag}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+def export_cache_get(key):
+    cache_dir = firm_dir(EXPORT_CACHE_DIR)
+    for ext in EXPORT_CACHE_TYPES:
+        path = os.path.join(cache_dir, f"{key}.{ext}")
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # mtime doubles as LRU clock
+            except OSError:
+                pass
+            return path, ext
+    return None, None
+
+def export_cache_put(key, ext, payload):
+    cache_dir = firm_dir(EXPORT_CACHE_DIR)
+    path = os.path.join(cache_dir, f"{key}.{ext}")
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    evict_export_cache()
+    return path
+
+def evict_export_cache(max_bytes=None):
+    """Remove least recently used artifacts until the current firm's cache fits in max_bytes"""
+    max_bytes = EXPORT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    cache_dir = firm_dir(EXPORT_CACHE_DIR)
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith('.tmp') or not os.path.isfile(path):
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def serve_cached_artifact(view, month, year, build, download_name=None, periods=None):
+    """Serve a cached artifact for (view, month, year), building it only when the data changed.
+
+    build(conn) gets a read-only snapshot connection and must return (payload_bytes, ext).
+    periods lists the (month, year) periods the artifact depends on (default: just this one).
+    Repeat requests with a matching If-None-Match / If-Modified-Since get a 304 without
+    touching the cache.
+    """
+    conn = get_read_db()
+    try:
+        version_tag, last_modified = get_data_version(conn, periods or [(month, year)])
+        key = export_cache_key(view, month, year, version_tag)
+
+        # compress_response() tags gzipped bodies as "<key>-gzip"; either form is current
+        if request.if_none_match.contains(key) or request.if_none_match.contains(f"{key}-gzip") or (
+                not request.if_none_match and last_modified and request.if_modified_since
+                and last_modified <= request.if_modified_since.replace(tzinfo=None)):
+            response = Response(status=304)
+        else:
+            path, ext = export_cache_get(key)
+            if path is None:
+                payload, ext = build(conn)
+                path = export_cache_put(key, ext, payload)
+            if download_name:
+                response = send_file(os.path.abspath(path), mimetype=EXPORT_CACHE_TYPES[ext], as_attachment=True,
+                                     download_name=f"{download_name}.{ext}", conditional=False)
+            else:
+                with open(path, 'rb') as f:
+                    response = Response(f.read(), mimetype=EXPORT_CACHE_TYPES[ext])
+    finally:
+        conn.close()
+
+    response.set_etag(key)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# ==================== STATIC ASSETS ====================
+
+_asset_digests = {}  # filename -> (mtime, content hash)
+
+def asset_digest(filename):
+    """Short content hash of a file under static/, recomputed only when the file changes"""
+    path = os.path.join(app.static_folder, filename)
+    mtime = os.path.getmtime(path)
+    cached = _asset_digests.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    _asset_digests[filename] = (mtime, digest)
+    return digest
+
+@app.template_global()
+def asset_url(filename):
+    """URL with the content hash in the file name, e.g. /assets/css/main.3f2a1b9c0d4e.css"""
+    try:
+        digest = asset_digest(filename)
+    except OSError:
+        return url_for('static', filename=filename)
+    stem, ext = os.path.splitext(filename)
+    return url_for('static_asset', filename=f"{stem}.{digest}{ext}")
+
+def build_asset_variants(filename, digest):
+    """gzip and (if the brotli package is installed) brotli copies of one asset version"""
+    out_dir = os.path.join(ASSET_CACHE_DIR, digest)
+    base = os.path.join(out_dir, os.path.basename(filename))
+    variants = {'gzip': base + '.gz'}
+    try:
+        import brotli
+        variants['br'] = base + '.br'
+    except ImportError:
+        brotli = None
+
+    missing = [enc for enc, path in variants.items() if not os.path.exists(path)]
+    if missing:
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(app.static_folder, filename), 'rb') as f:
+            raw = f.read()
+        for enc in missing:
+            payload = brotli.compress(raw, quality=11) if enc == 'br' else gzip.compress(raw, compresslevel=9, mtime=0)
+            fd, tmp_path = tempfile.mkstemp(dir=out_dir)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, variants[enc])
+    return variants
+
+def build_static_assets():
+    """Pre-compress every static file once per server start so requests never compress assets"""
+    for root, _, files in os.walk(app.static_folder):
+        for name in files:
+            filename = os.path.relpath(os.path.join(root, name), app.static_folder).replace(os.sep, '/')
+            build_asset_variants(filename, asset_digest(filename))
+
+@app.route('/assets/<path:filename>')
+def static_asset(filename):
+    """Hashed static file with immutable caching, served pre-compressed when the browser allows"""
+    stem, ext = os.path.splitext(filename)
+    stem, _, digest = stem.rpartition('.')
+    source = stem + ext
+    path = safe_join(app.static_folder, source)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    try:
+        current = asset_digest(source)
+    except (OSError, ValueError):
+        abort(404)
+    if digest != current:
+        # A page rendered before the file changed - send it to the current version
+        return redirect(asset_url(source))
+
+    encoding = None
+    variants = build_asset_variants(source, digest)
+    for enc in ('br', 'gzip'):
+        if enc in variants and enc in request.accept_encodings:
+            path, encoding = variants[enc], enc
+            break
+
+    mimetype = {'.css': 'text/css', '.js': 'text/javascript'}.get(ext)
+    response = send_file(os.path.abspath(path), mimetype=mimetype, download_name=os.path.basename(source),
+                         etag=f"{digest}-{encoding or 'identity'}", max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip large HTML/JSON responses on the fly; streamed pages are gzipped chunk by chunk, files left alone"""
+    if (response.is_streamed and not response.direct_passthrough and response.status_code == 200
+            and response.mimetype == 'text/html' and 'Content-Encoding' not in response.headers
+            and 'gzip' in request.accept_encodings):
+        response.response = gzip_chunks(response.response)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers.pop('Content-Length', None)
+        response.vary.add('Accept-Encoding')
+        return response
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESS_MIMETYPES
+            or 'gzip' not in request.accept_encodings):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-gzip", weak)
+    return response
+
+# ==================== STREAMED PAGES ====================
+# Pages that list users or clients render through stream_page(): rows are pulled
+# from an open cursor one page at a time (RowPage) while the template streams out,
+# so neither the row list nor the whole HTML is ever held in memory.
+
+class RowPage:
+    """One keyset page of rows, read lazily from a cursor while the template iterates it.
+
+    Rows carry a sort_value column; next_cursor (for ?after=) is only known once the
+    rows have been iterated, so templates render the pager after the row loop.
+    """
+
+    def __init__(self, cursor, limit, sort, order):
+        self.cursor, self.limit, self.sort, self.order = cursor, limit, sort, order
+        self.count = 0
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        for row in self.cursor:
+            if self.count == self.limit:
+                self.next_cursor = json.dumps([last['sort_value'], last['id']])
+                break
+            self.count += 1
+            last = row
+            yield row
+        self.cursor.close()
+
+def page_request_args(sort_options, default_sort):
+    """(sort, order, after, limit) from ?sort=&order=asc|desc&after=<cursor>&limit="""
+    sort = request.args.get('sort') if request.args.get('sort') in sort_options else default_sort
+    order = 'desc' if request.args.get('order') == 'desc' else 'asc'
+    try:
+        after = json.loads(request.args.get('after', ''))
+    except ValueError:
+        after = None
+    if not (isinstance(after, list) and len(after) == 2 and isinstance(after[0], (str, int, float))
+            and isinstance(after[1], int) and not isinstance(after[1], bool)):
+        after = None
+    limit = max(1, min(request.args.get('limit', PAGE_SIZE, type=int), 500))
+    return sort, order, after, limit
+
+def query_page(conn, sql, params, sort_options, sort, order, after=None, limit=PAGE_SIZE):
+    """Keyset page of `sql` (which must select an id column) ordered by sort_options[sort], then id"""
+    op, direction = ('<', 'DESC') if order == 'desc' else ('>', 'ASC')
+    where, page_params = "", list(params)
+    if after:
+        where = f"WHERE (sort_value, id) {op} (?, ?)"
+        page_params += after
+    cursor = conn.execute(f"""
+        SELECT * FROM (SELECT q.*, {sort_options[sort]} AS sort_value FROM ({sql}) q) {where}
+        ORDER BY sort_value {direction}, id {direction} LIMIT ?
+    """, page_params + [limit + 1])
+    return RowPage(cursor, limit, sort, order)
+
+def stream_page(template_name, conn=None, **context):
+    """Stream a template in chunks of about STREAM_CHUNK_CHARS; conn is closed once the page is sent.
+
+    The session cookie goes out before the body, so flashes are popped here and passed
+    in as flashed_messages - read from the template they would never be cleared.
+    """
+    context['flashed_messages'] = get_flashed_messages(with_categories=True)
+
+    def chunks():
+        try:
+            buffer, size = [], 0
+            for piece in stream_template(template_name, **context):
+                buffer.append(piece)
+                size += len(piece)
+                if size >= STREAM_CHUNK_CHARS:
+                    yield ''.join(buffer)
+                    buffer, size = [], 0
+            if buffer:
+                yield ''.join(buffer)
+        finally:
+            if conn is not None:
+                conn.close()
+    return Response(stream_with_context(chunks()), mimetype='text/html')
+
+def gzip_chunks(chunks):
+    """gzip a streamed body, flushing after every chunk so the browser renders as it arrives"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
 # ==================== DECORATORS ====================
 
 def login_required(f):
@@ -301,6 +2045,65 @@ def role_required(*roles):
         return decorated_function
     return decorator
 
+# ==================== FIRM ROUTING ====================
+
+class FirmPathMiddleware:
+    """Serves /f/<firm>/... with the prefix moved into SCRIPT_NAME, so url_for() keeps it"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path.startswith('/f/'):
+            firm, _, rest = path[3:].partition('/')
+            environ['gstpro.firm'] = firm.lower()
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + '/f/' + firm
+            environ['PATH_INFO'] = '/' + rest
+        return self.wsgi_app(environ, start_response)
+
+if MULTI_FIRM:
+    app.wsgi_app = FirmPathMiddleware(app.wsgi_app)
+
+def resolve_request_firm():
+    """Firm for this request: path prefix, then subdomain, then login form, then session"""
+    firm = request.environ.get('gstpro.firm')
+    if not firm:
+        host = request.host.split(':')[0]
+        label = host.split('.')[0].lower()
+        if '.' in host and firm_exists(label):
+            firm = label
+    if not firm and request.endpoint == 'login' and request.method == 'POST':
+        firm = request.form.get('firm', '').strip().lower()
+    return firm or session.get('firm')
+
+@app.before_request
+def select_firm():
+    if not MULTI_FIRM or request.endpoint in ('static', 'static_asset'):
+        return
+    firm = resolve_request_firm()
+    if not firm_exists(firm):
+        if request.endpoint == 'login':
+            # The login form asks for the firm when the URL does not name one
+            if firm and request.method == 'POST':
+                flash('Unknown firm', 'error')
+            return render_template('login.html', multi_firm=True, firm=None)
+        if request.endpoint in ('logout', 'index') or not firm:
+            session.clear()
+            return redirect(url_for('login'))
+        abort(404)
+    # A login is only valid for the firm it was made against
+    if session.get('firm') not in (None, firm):
+        session.clear()
+    g.firm = firm
+    g.firm_token = _current_firm.set(firm)
+
+@app.teardown_request
+def release_firm(exc=None):
+    token = g.pop('firm_token', None)
+    if token is not None:
+        _current_firm.reset(token)
+
 # ==================== ROUTES ====================
 
 @app.route('/')
@@ -323,13 +2126,15 @@ def login():
             session['user_id'] = user['id']
             session['username'] = user['username']
             session['role'] = user['role']
+            if MULTI_FIRM:
+                session['firm'] = g.firm
             log_activity(user['id'], 'LOGIN')
             flash(f'Welcome back, {username}!', 'success')
             return redirect(url_for('dashboard'))
         else:
             flash('Invalid username or password', 'error')
 
-    return render_template('login.html')
+    return render_template('login.html', multi_firm=MULTI_FIRM, firm=g.get('firm'))
 
 @app.route('/logout')
 def logout():
@@ -337,6 +2142,36 @@ def logout():
     flash('You have been logged out', 'success')
     return redirect(url_for('login'))
 
+WORKLIST_SQL = """
+    SELECT c.id, c.id AS client_id, c.client_name, c.gstin, a.gstr1_preparer_id, a.gstr3b_preparer_id,
+           g1.status AS gstr1_status, g3.status AS gstr3b_status
+    FROM client_assignments a
+    JOIN clients c ON c.id = a.client_id
+    LEFT JOIN gstr1_records g1 ON g1.client_id = c.id AND g1.month = ? AND g1.year = ?
+    LEFT JOIN gstr3b_records g3 ON g3.client_id = c.id AND g3.month = ? AND g3.year = ?
+    WHERE a.month = ? AND a.year = ? AND c.status = 'active'
+      AND (a.gstr1_preparer_id = ? OR a.gstr3b_preparer_id = ?)
+"""
+WORKLIST_SORTS = {
+    'client': "lower(client_name)",
+    'gstin': "COALESCE(gstin, '')",
+    'gstr1': "COALESCE(gstr1_status, '')",
+    'gstr3b': "COALESCE(gstr3b_status, '')",
+}
+REVIEW_QUEUE_SQL = """
+    SELECT g.id * 2 AS id, 'gstr1' AS return_type, g.client_id, g.month, g.year, c.client_name
+    FROM gstr1_records g JOIN clients c ON c.id = g.client_id
+    WHERE g.status = 'under_review' AND g.reviewer_id = ?
+    UNION ALL
+    SELECT g.id * 2 + 1, 'gstr3b', g.client_id, g.month, g.year, c.client_name
+    FROM gstr3b_records g JOIN clients c ON c.id = g.client_id
+    WHERE g.status = 'under_review' AND g.reviewer_id = ?
+"""
+REVIEW_SORTS = {
+    'period': "year * 100 + month",
+    'client': "lower(client_name)",
+}
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
@@ -344,7 +2179,7 @@ def dashboard():
     fy = get_financial_year(curr_month, curr_year)
     month_name = datetime(2000, curr_month, 1).strftime('%B')
 
-    conn = get_db()
+    conn = get_read_db()
     user_id = session['user_id']
     role = session['role']
 
@@ -390,28 +2225,125 @@ def dashboard():
             })
 
         elif role == 'reviewer':
-            data.update({'view': 'reviewer', 'pending_count': 0})
+            sql, params = REVIEW_QUEUE_SQL, [user_id, user_id]
+            sort, order, after, limit = page_request_args(REVIEW_SORTS, 'period')
+            pending_count = conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+            data.update({'view': 'reviewer', 'pending_count': pending_count,
+                         'review_items': query_page(conn, sql, params, REVIEW_SORTS, sort, order, after, limit)})
         else:
-            data.update({'view': 'preparer', 'assigned_clients': []})
+            month = request.args.get('month', curr_month, type=int)
+            year = request.args.get('year', curr_year, type=int)
+            if not 1 <= month <= 12 or not 2017 <= year <= 2100:
+                month, year = curr_month, curr_year
+            sort, order, after, limit = page_request_args(WORKLIST_SORTS, 'client')
+            data.update({'view': 'preparer', 'month': month, 'year': year,
+                         'period_name': f"{datetime(2000, month, 1):%B} {year}",
+                         'assigned_clients': query_page(conn, WORKLIST_SQL, [month, year] * 3 + [user_id, user_id],
+                                                        WORKLIST_SORTS, sort, order, after, limit)})
 
     except Exception as e:
         app.logger.error(f'Dashboard error: {e}')
         data.update({'view': role, 'error': str(e)})
 
-    conn.close()
-    return render_template('dashboard.html', **data, user_role=role)
+    return stream_page('dashboard.html', conn, **data, user_role=role)
+
+USER_SORTS = {
+    'username': "lower(username)",
+    'role': "role || '/' || lower(username)",
+    'created': "COALESCE(created_at, '')",
+}
 
 @app.route('/admin')
 @login_required
 @role_required('admin')
 def admin_panel():
-    conn = get_db()
-    users = conn.execute("SELECT * FROM users ORDER BY role, username").fetchall()
-    clients = conn.execute("SELECT * FROM clients WHERE status = 'active' ORDER BY client_name").fetchall()
-    preparers = [u for u in users if u['role'] == 'preparer']
-    reviewers = [u for u in users if u['role'] == 'reviewer']
+    conn = get_read_db()
+    sort, order, after, limit = page_request_args(USER_SORTS, 'role')
+    users = query_page(conn, "SELECT id, username, role, active, created_at FROM users", [],
+                       USER_SORTS, sort, order, after, limit)
+    preparers = conn.execute("SELECT id, username FROM users WHERE role = 'preparer' ORDER BY username").fetchall()
+    # Clients are not rendered here; the allocation table searches /api/clients/search
+    return stream_page('admin_panel.html', conn, users=users, preparers=preparers)
+
+@app.route('/api/clients/search')
+@login_required
+def client_search_api():
+    """Typeahead: ?q=<text>&limit=20, next page with after_name/after_id; month/year add assignments"""
+    limit = min(max(request.args.get('limit', CLIENT_SEARCH_LIMIT, type=int), 1), 100)
+    after = None
+    if request.args.get('after_id', type=int):
+        after = (request.args.get('after_name', ''), request.args.get('after_id', type=int))
+    conn = get_read_db()
+    rows, next_cursor = search_clients(conn, request.args.get('q', ''), limit, after,
+                                       request.args.get('month', type=int), request.args.get('year', type=int))
+    conn.close()
+    return jsonify({'items': rows, 'next_cursor': next_cursor})
+
+def trend_request_range():
+    """?from=YYYY-MM&to=YYYY-MM as (month, year) bounds for get_client_trend()"""
+    bounds = []
+    for arg in ('from', 'to'):
+        try:
+            year, month = request.args.get(arg, '').split('-')
+            bounds.append((int(month), int(year)))
+        except ValueError:
+            bounds.append(None)
+    return bounds
+
+@app.route('/clients/<int:client_id>/history')
+@login_required
+def client_history(client_id):
+    conn = get_read_db()
+    client = conn.execute("SELECT * FROM clients WHERE id=?", (client_id,)).fetchone()
+    if not client:
+        conn.close()
+        flash('Client not found', 'error')
+        return redirect(url_for('dashboard'))
+    rows = get_client_trend(conn, client_id, *trend_request_range())
     conn.close()
-    return render_template('admin_panel.html', users=users, clients=clients, preparers=preparers, reviewers=reviewers)
+
+    years = {}
+    for row in reversed(rows):
+        years.setdefault(get_financial_year(row['month'], row['year']), []).append(row)
+    return render_template('client_history.html', client=client, rows=rows, years=years,
+                           latest=rows[-1] if rows else None)
+
+@app.route('/api/clients/<int:client_id>/trend')
+@login_required
+def client_trend_api(client_id):
+    """Monthly figures with rolling 3/12-month sums and YoY deltas, oldest first"""
+    conn = get_read_db()
+    rows = get_client_trend(conn, client_id, *trend_request_range())
+    conn.close()
+    return jsonify({'client_id': client_id, 'items': rows})
+
+@app.route('/api/period_state')
+@login_required
+def period_state_api():
+    """?month=&year=&fields=a,b&since=<version> - columnar state of one period, see get_period_state()"""
+    default_month, default_year = get_current_month_year()
+    month = request.args.get('month', default_month, type=int)
+    year = request.args.get('year', default_year, type=int)
+    if not 1 <= month <= 12 or not 2017 <= year <= 2100:
+        return jsonify({'error': f'invalid period {month}/{year}'}), 400
+    fields = [f for f in request.args.get('fields', '').split(',') if f] or None
+    since = request.args.get('since')
+    preparer_id = session['user_id'] if session['role'] == 'preparer' else None
+
+    conn = get_read_db()
+    try:
+        version = period_state_version(conn, month, year)
+        etag = hashlib.md5(f"{month}-{year}-{version}-{fields}-{since}-{preparer_id}".encode()).hexdigest()
+        if request.if_none_match.contains(etag) or request.if_none_match.contains(f"{etag}-gzip"):
+            response = Response(status=304)
+        else:
+            response = jsonify(get_period_state(conn, month, year, fields, since, preparer_id))
+    finally:
+        conn.close()
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 @app.route('/reports')
 @login_required
@@ -422,67 +2354,119 @@ def reports():
     year = int(request.args.get('year', get_current_month_year()[1]))
     fy_label = get_financial_year(month, year)
 
-    conn = get_db()
-    clients = conn.execute("SELECT * FROM clients WHERE status = 'active' ORDER BY client_name").fetchall()
-    total = len(clients)
+    def build(conn):
+        total = conn.execute("SELECT COUNT(*) FROM clients WHERE status = 'active'").fetchone()[0]
+        g1_filed = conn.execute("SELECT COUNT(*) FROM gstr1_records WHERE month=? AND year=? AND status='locked'",
+                               (month, year)).fetchone()[0]
+        g3_filed = conn.execute("SELECT COUNT(*) FROM gstr3b_records WHERE month=? AND year=? AND status='locked'",
+                               (month, year)).fetchone()[0]
+
+        # Amounts are integer paise, so period/FY totals are exact straight from SUM()
+        span = periods or [(month, year)]
+        bounds = (span[0][1], span[0][0], span[-1][1], span[-1][0])
+        sales, output_tax = conn.execute("""
+            SELECT COALESCE(SUM(total_sales), 0), COALESCE(SUM(total_cgst + total_sgst + total_igst), 0)
+            FROM gstr1_records WHERE (year, month) BETWEEN (?, ?) AND (?, ?)
+        """, bounds).fetchone()
+        net_liability = conn.execute("""
+            SELECT COALESCE(SUM(net_total), 0) FROM gstr3b_records WHERE (year, month) BETWEEN (?, ?) AND (?, ?)
+        """, bounds).fetchone()[0]
+
+        html = render_template('reports.html', view_type=view_type, fy_label=fy_label,
+                               month=month, year=year, total=total,
+                               g1_filed=g1_filed, g1_pending=total-g1_filed,
+                               g3_filed=g3_filed, g3_pending=total-g3_filed,
+                               total_sales=to_rupees(sales), output_tax=to_rupees(output_tax),
+                               net_liability=to_rupees(net_liability))
+        return html.encode('utf-8'), 'html'
+
+    periods = get_fy_periods(month, year) if view_type == 'fy' else None
+    return serve_cached_artifact(f'report-{view_type}', month, year, build, periods=periods)
+
+def build_export_rows(conn, periods):
+    data = []
+    for month, year in periods:
+        rows = conn.execute("""
+            SELECT c.client_name, c.gstin,
+                   g1.status AS g1_status, g1.arn_number AS g1_arn,
+                   g3.status AS g3_status, g3.arn_number AS g3_arn
+            FROM clients c
+            LEFT JOIN gstr1_records g1 ON g1.client_id = c.id AND g1.month = ? AND g1.year = ?
+            LEFT JOIN gstr3b_records g3 ON g3.client_id = c.id AND g3.month = ? AND g3.year = ?
+            WHERE c.status = 'active'
+            ORDER BY c.client_name
+        """, (month, year, month, year))
+
+        for row in rows:
+            data.append({
+                'Client': row['client_name'],
+                'GSTIN': row['gstin'] or '',
+                'Period': f"{month}-{year}",
+                'GSTR-1 Status': row['g1_status'] or 'Not Started',
+                'GSTR-1 ARN': row['g1_arn'] or '',
+                'GSTR-3B Status': row['g3_status'] or 'Pending',
+                'GSTR-3B ARN': row['g3_arn'] or ''
+            })
+    return data
 
-    g1_filed = conn.execute("SELECT COUNT(*) FROM gstr1_records WHERE month=? AND year=? AND status='locked'",
-                           (month, year)).fetchone()[0]
-    g3_filed = conn.execute("SELECT COUNT(*) FROM gstr3b_records WHERE month=? AND year=? AND status='locked'",
-                           (month, year)).fetchone()[0]
+def build_export_file(rows, sheet_name='GST Report'):
+    """Write export rows to XLSX without pandas; CSV when no Excel writer is installed.
 
-    conn.close()
+    Writers are imported here, not at module load, so only export requests pay for them.
+    """
+    headers = list(rows[0].keys()) if rows else []
+    try:
+        import xlsxwriter
+        output = BytesIO()
+        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+        sheet = workbook.add_worksheet(sheet_name)
+        sheet.write_row(0, 0, headers)
+        for i, row in enumerate(rows, start=1):
+            sheet.write_row(i, 0, list(row.values()))
+        workbook.close()
+        return output.getvalue(), 'xlsx'
+    except ImportError:
+        pass
+    try:
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(sheet_name)
+        sheet.append(headers)
+        for row in rows:
+            sheet.append(list(row.values()))
+        output = BytesIO()
+        workbook.save(output)
+        return output.getvalue(), 'xlsx'
+    except ImportError:
+        pass
 
-    return render_template('reports.html', view_type=view_type, fy_label=fy_label, 
-                         month=month, year=year, total=total,
-                         g1_filed=g1_filed, g1_pending=total-g1_filed,
-                         g3_filed=g3_filed, g3_pending=total-g3_filed,
-                         report_data=[])
+    # Fallback to CSV if no Excel writer is installed
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row.values())
+    return output.getvalue().encode('utf-8'), 'csv'
 
 @app.route('/export/excel')
 @login_required
 def export_excel():
+    view_type = request.args.get('view', 'monthly')
     month = int(request.args.get('month', get_current_month_year()[0]))
     year = int(request.args.get('year', get_current_month_year()[1]))
 
-    conn = get_db()
-    clients = conn.execute("SELECT * FROM clients WHERE status='active'").fetchall()
-
-    data = []
-    for client in clients:
-        g1 = conn.execute("SELECT status, arn_number FROM gstr1_records WHERE client_id=? AND month=? AND year=?",
-                         (client['id'], month, year)).fetchone()
-        g3 = conn.execute("SELECT status, arn_number FROM gstr3b_records WHERE client_id=? AND month=? AND year=?",
-                         (client['id'], month, year)).fetchone()
-
-        data.append({
-            'Client': client['client_name'],
-            'GSTIN': client['gstin'] or '',
-            'Period': f"{month}-{year}",
-            'GSTR-1 Status': g1['status'] if g1 else 'Not Started',
-            'GSTR-1 ARN': g1['arn_number'] if g1 else '',
-            'GSTR-3B Status': g3['status'] if g3 else 'Pending',
-            'GSTR-3B ARN': g3['arn_number'] if g3 else ''
-        })
+    if view_type == 'fy':
+        periods = get_fy_periods(month, year)
+        download_name = f'GST_Report_FY_{get_financial_year(month, year)}'
+    else:
+        periods = [(month, year)]
+        download_name = f'GST_Report_{month}_{year}'
 
-    conn.close()
+    def build(conn):
+        return build_export_file(build_export_rows(conn, periods))
 
-    try:
-        df = pd.DataFrame(data)
-        output = BytesIO()
-        df.to_excel(output, index=False, sheet_name='GST Report')
-        output.seek(0)
-        return send_file(output, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                         as_attachment=True, download_name=f'GST_Report_{month}_{year}.xlsx')
-    except:
-        # Fallback to CSV if pandas fails
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=data[0].keys() if data else [])
-        writer.writeheader()
-        writer.writerows(data)
-        output.seek(0)
-        return Response(output.getvalue(), mimetype='text/csv',
-                       headers={'Content-Disposition': f'attachment;filename=GST_Report_{month}_{year}.csv'})
+    return serve_cached_artifact(f'export-{view_type}', month, year, build,
+                                 download_name=download_name, periods=periods)
 
 # Admin routes
 @app.route('/admin/user', methods=['POST'])
@@ -576,6 +2560,7 @@ def gstr1_form(client_id, month, year):
             INSERT INTO gstr1_records (client_id, month, year, preparer_id, prepared_at)
             VALUES (?, ?, ?, ?, ?)
         """, (client_id, month, year, session['user_id'], datetime.now()))
+        refresh_client_trend(conn, client_id, month, year)
         conn.commit()
         record = conn.execute("""
             SELECT * FROM gstr1_records WHERE client_id=? AND month=? AND year=?
@@ -590,7 +2575,7 @@ def gstr1_form(client_id, month, year):
               'July', 'August', 'September', 'October', 'November', 'December']
 
     return render_template('gstr1_form.html', 
-                         client=client, record=record, month=month, year=year,
+                         client=client, record=rupee_fields(record, 'gstr1_records'), month=month, year=year,
                          month_name=months[month-1], reviewers=reviewers,
                          can_edit=can_edit, is_locked=is_locked, user_role=session['role'])
 
@@ -600,16 +2585,14 @@ def api_gstr1_autosave():
     data = request.json
     record_id = data.get('record_id')
 
+    try:
+        b2b, b2c, credit, debit, sez, tally, cgst, sgst, igst = (to_paise(data.get(f, 0)) for f in (
+            'b2b_sales', 'b2c_sales', 'credit_note', 'debit_note', 'sez_exempted',
+            'sales_as_per_tally', 'total_cgst', 'total_sgst', 'total_igst'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     conn = get_db()
-    b2b = float(data.get('b2b_sales', 0))
-    b2c = float(data.get('b2c_sales', 0))
-    credit = float(data.get('credit_note', 0))
-    debit = float(data.get('debit_note', 0))
-    sez = float(data.get('sez_exempted', 0))
-    tally = float(data.get('sales_as_per_tally', 0))
-    cgst = float(data.get('total_cgst', 0))
-    sgst = float(data.get('total_sgst', 0))
-    igst = float(data.get('total_igst', 0))
 
     total = b2b + b2c - credit + debit + sez
     variance = total - tally
@@ -621,10 +2604,11 @@ def api_gstr1_autosave():
             total_cgst=?, total_sgst=?, total_igst=?, preparer_id=?
         WHERE id=?
     """, (b2b, b2c, credit, debit, sez, total, tally, variance, cgst, sgst, igst, session['user_id'], record_id))
+    refresh_record_trend(conn, 'gstr1_records', record_id)
 
     conn.commit()
     conn.close()
-    return jsonify({'success': True, 'total_sales': total, 'variance': variance})
+    return jsonify({'success': True, 'total_sales': to_rupees(total), 'variance': to_rupees(variance)})
 
 @app.route('/api/gstr1/checklist', methods=['POST'])
 @login_required
@@ -676,17 +2660,23 @@ def gstr3b_form(client_id, month, year):
             INSERT INTO gstr3b_records (client_id, month, year, gstr1_tv, gstr1_cgst, gstr1_sgst, gstr1_igst)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         """, (client_id, month, year, gstr1['total_sales'], gstr1['total_cgst'], gstr1['total_sgst'], gstr1['total_igst']))
+        refresh_client_trend(conn, client_id, month, year)
+        recompute_itc_ledger(conn, client_id, month, year)
         conn.commit()
         record = conn.execute("""
             SELECT * FROM gstr3b_records WHERE client_id=? AND month=? AND year=?
         """, (client_id, month, year)).fetchone()
 
+    ledger = conn.execute("SELECT * FROM itc_ledger WHERE client_id=? AND month=? AND year=?",
+                          (client_id, month, year)).fetchone()
     conn.close()
 
     months = ['January', 'February', 'March', 'April', 'May', 'June', 
               'July', 'August', 'September', 'October', 'November', 'December']
 
-    return render_template('gstr3b_form.html', client=client, record=record, gstr1=gstr1,
+    return render_template('gstr3b_form.html', client=client, record=rupee_fields(record, 'gstr3b_records'),
+                         gstr1=rupee_fields(gstr1, 'gstr1_records'),
+                         ledger=rupee_fields(ledger, 'itc_ledger') if ledger else None,
                          month=month, year=year, month_name=months[month-1],
                          can_edit=True, is_locked=False)
 
@@ -694,67 +2684,187 @@ def gstr3b_form(client_id, month, year):
 @login_required
 def api_gstr3b_save():
     data = request.json
-    conn = get_db()
+    try:
+        values = {f: to_paise(data.get(f, 0)) for f in GSTR3B_INPUT_FIELDS}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    fields = ['liability_tv', 'liability_cgst', 'liability_sgst', 'liability_igst',
-              'tv_2b', 'cgst_2b', 'sgst_2b', 'igst_2b',
-              'tv_tally', 'cgst_tally', 'sgst_tally', 'igst_tally',
-              'ineligible_cgst', 'ineligible_sgst', 'ineligible_igst',
-              'rcm_cgst', 'rcm_sgst', 'rcm_igst',
-              'interest_cgst', 'interest_sgst', 'interest_igst', 'late_fee',
-              'eligible_cgst', 'eligible_sgst', 'eligible_igst',
-              'net_cgst', 'net_sgst', 'net_igst', 'tv_variance']
+    conn = get_db()
+    record = conn.execute("SELECT client_id, month, year, gstr1_tv FROM gstr3b_records WHERE id=?",
+                          (data.get('record_id'),)).fetchone()
+    if not record:
+        conn.close()
+        return jsonify({'error': 'Record not found'}), 404
+
+    # Derived figures are recomputed here in paise rather than trusted from the browser
+    values.update(compute_gstr3b(dict(values, gstr1_tv=record['gstr1_tv'])))
+    sql = "UPDATE gstr3b_records SET " + ", ".join([f"{f}=?" for f in values]) + " WHERE id=?"
+    conn.execute(sql, list(values.values()) + [data.get('record_id')])
+    refresh_record_trend(conn, 'gstr3b_records', data.get('record_id'))
+    recompute_itc_ledger(conn, record['client_id'], record['month'], record['year'])
+    conn.commit()
+    conn.close()
+    return jsonify({'success': True, 'net_total': to_rupees(values['net_total']),
+                    'tv_variance': to_rupees(values['tv_variance'])})
 
-    values = [float(data.get(f, 0)) for f in fields]
-    values.append(data.get('record_id'))
+# Archive route (missing)
+@app.route('/admin/archive_fy', methods=['POST'])
+@login_required
+@role_required('admin')
+def archive_fy():
+    fy = request.form.get('fy')
+    archive_shard(fy)
+    flash(f'Financial Year {fy} archived', 'success')
+    return redirect(url_for('admin_panel'))
 
-    sql = "UPDATE gstr3b_records SET " + ", ".join([f"{f}=?" for f in fields]) + " WHERE id=?"
-    conn.execute(sql, values)
+@app.route('/admin/itc_ledger/rebuild', methods=['POST'])
+@login_required
+@role_required('admin')
+def rebuild_itc_ledger_route():
+    conn = get_db()
+    written = rebuild_itc_ledger(conn)
     conn.commit()
     conn.close()
-    return jsonify({'success': True})
+    log_activity(session['user_id'], 'ITC_LEDGER_REBUILD', f'{written} ledger rows recomputed')
+    flash(f'ITC ledger rebuilt: {written} periods recomputed', 'success')
+    return redirect(url_for('admin_panel'))
 
-# Init and run
-if __name__ == '__main__':
-    init_db()
+@app.route('/admin/health')
+@login_required
+@role_required('admin')
+def database_health():
+    conn = get_read_db()
+    stats = database_stats(conn)
+    stats['fragmentation'], stats['fragmentation_at'] = last_fragmentation(conn)
+    history, last_runs = get_maintenance_history(conn)
+    conn.close()
+    return render_template('db_health.html', stats=stats, history=history, last_runs=last_runs,
+                           window=MAINTENANCE_HOURS)
 
-    # Simple backup
+@app.route('/admin/health/run', methods=['POST'])
+@login_required
+@role_required('admin')
+def run_database_maintenance():
+    done = run_maintenance(force=True)
+    log_activity(session['user_id'], 'DB_MAINTENANCE', ', '.join(done))
+    flash(f"Maintenance complete: {', '.join(done)}", 'success')
+    return redirect(url_for('database_health'))
+
+@app.route('/admin/bulk_filing', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def bulk_filing():
+    """Upload a portal CSV/JSON of filed returns; preview first, then lock them all at once"""
+    if request.method == 'GET':
+        return render_template('bulk_filing.html', report=None)
+
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash('Choose a CSV or JSON file', 'error')
+        return redirect(url_for('bulk_filing'))
+    dry_run = request.form.get('dry_run') == '1'
     try:
-        today = datetime.now()
-        backup_name = f"{BACKUP_DIR}/gst_backup_{today.strftime('%Y%m')}.db"
-        if not os.path.exists(backup_name) and os.path.exists('gst_database.db'):
-            shutil.copy('gst_database.db', backup_name)
-    except:
-        pass
+        rows = parse_filing_upload(upload.filename, upload.read())
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        flash(f'Could not read file: {e}', 'error')
+        return redirect(url_for('bulk_filing'))
 
-    print("="*60)
-    print("GST Pro v2.0 Server Starting...")
-    print("="*60)
-    print("Access URLs:")
-    print("  Local:   http://127.0.0.1:5000")
-    print("  Network: http://YOUR_IP:5000")
-    print("="*60)
-    print("Press CTRL+C to stop")
-    print("="*60)
+    conn = get_db()
+    report, ok = bulk_file_returns(conn, rows, dry_run=dry_run)
+    conn.close()
+    filed = sum(r['status'] == 'filed' for r in report)
+    if ok and not dry_run:
+        log_activity(session['user_id'], 'BULK_FILING', f'{filed} returns locked from {upload.filename}')
+        flash(f'{filed} returns filed and locked', 'success')
+    elif ok:
+        flash(f'Preview: {filed} returns will be filed. Upload again without preview to apply.', 'success')
+    else:
+        flash('Nothing was saved - fix the rows marked as errors and upload again', 'error')
+    return render_template('bulk_filing.html', report=report, ok=ok, dry_run=dry_run, filed=filed)
+
+@app.route('/api/bulk_filing', methods=['POST'])
+@login_required
+@role_required('admin')
+def bulk_filing_api():
+    """JSON body {"rows": [{gstin, period, return_type, arn, filed_date}], "dry_run": false}"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'expected a JSON object with "rows"'}), 400
+    try:
+        rows = parse_filing_upload('upload.json', json.dumps(data.get('rows', [])))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    conn = get_db()
+    report, ok = bulk_file_returns(conn, rows, dry_run=bool(data.get('dry_run')))
+    conn.close()
+    if ok and not data.get('dry_run'):
+        log_activity(session['user_id'], 'BULK_FILING',
+                     f"{sum(r['status'] == 'filed' for r in report)} returns locked via API")
+    return jsonify({'success': ok, 'report': report}), 200 if ok else 422
+
+def late_fee_request_args(source):
+    """(periods, as_of, form) from ?view=monthly|fy&month=&year=&as_of=YYYY-MM-DD"""
+    default_month, default_year = get_current_month_year()
+    form = {'view': source.get('view', 'monthly'),
+            'month': int(source.get('month') or default_month),
+            'year': int(source.get('year') or default_year),
+            'as_of': source.get('as_of') or datetime.now().strftime('%Y-%m-%d')}
+    if not 1 <= form['month'] <= 12 or not 2017 <= form['year'] <= 2100:
+        raise ValueError(f"invalid period {form['month']}/{form['year']}")
+    periods = get_fy_periods(form['month'], form['year']) if form['view'] == 'fy' else [(form['month'], form['year'])]
+    return periods, datetime.strptime(form['as_of'], '%Y-%m-%d'), form
+
+def late_charges_in_rupees(results):
+    return [dict(rupee_fields(r, 'gstr3b_records'), entered=rupee_fields(r['entered'], 'gstr3b_records'))
+            for r in results]
+
+@app.route('/admin/late_fees', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def late_fees():
+    """GET previews interest and late fee for a month or FY; POST writes them to the unlocked returns"""
+    source = request.form if request.method == 'POST' else request.args
+    try:
+        periods, as_of, form = late_fee_request_args(source)
+    except ValueError:
+        flash('Invalid month, year or date', 'error')
+        return redirect(url_for('late_fees'))
 
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    if request.method == 'POST':
+        conn = get_db()
+        updated = apply_late_charges(conn, calculate_late_charges(conn, periods, as_of))
+        conn.close()
+        log_activity(session['user_id'], 'LATE_FEES',
+                     f"Interest/late fee updated on {updated} GSTR-3B returns as of {form['as_of']}")
+        flash(f'Interest and late fee updated on {updated} returns', 'success')
+        return redirect(url_for('late_fees', **form))
 
+    conn = get_read_db()
+    results = calculate_late_charges(conn, periods, as_of)
+    conn.close()
+    return render_template('late_fees.html', rows=late_charges_in_rupees(results), form=form,
+                           pending=sum(r['changed'] and not r['locked'] for r in results))
 
-# Archive route (missing)
-@app.route('/admin/archive_fy', methods=['POST'])
+@app.route('/api/late_fees', methods=['POST'])
 @login_required
 @role_required('admin')
-def archive_fy():
-    fy = request.form.get('fy')
+def late_fees_api():
+    """JSON body {"view": "monthly"|"fy", "month", "year", "as_of": "YYYY-MM-DD", "dry_run": false}"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'expected a JSON object'}), 400
+    try:
+        periods, as_of, form = late_fee_request_args(data)
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     conn = get_db()
-    archive_db = f"{ARCHIVE_DIR}/gst_archive_{fy}.db"
-    if os.path.exists('gst_database.db'):
-        shutil.copy('gst_database.db', archive_db)
-        conn.execute("INSERT INTO archived_periods (fy, file_path) VALUES (?, ?)", (fy, archive_db))
-        conn.commit()
-        flash(f'Financial Year {fy} archived', 'success')
+    results = calculate_late_charges(conn, periods, as_of)
+    updated = 0 if data.get('dry_run') else apply_late_charges(conn, results)
     conn.close()
-    return redirect(url_for('admin_panel'))
+    if updated:
+        log_activity(session['user_id'], 'LATE_FEES',
+                     f"Interest/late fee updated on {updated} GSTR-3B returns via API as of {form['as_of']}")
+    return jsonify({'success': True, 'updated': updated, 'items': late_charges_in_rupees(results)})
 
 # Check due dates API
 @app.route('/api/check_due_dates')
@@ -766,20 +2876,45 @@ def check_due_dates():
 @app.route('/api/notifications')
 @login_required
 def get_notifications_api():
+    """Newest first, keyset paginated: ?before=<id>&limit=20, add all=1 to include read ones"""
     user_id = session['user_id']
+    before = request.args.get('before', type=int)
+    limit = min(max(request.args.get('limit', NOTIFICATION_PAGE_SIZE, type=int), 1), 100)
+    sql = "SELECT * FROM notifications WHERE user_id=?"
+    params = [user_id]
+    if not request.args.get('all'):
+        sql += " AND is_read=0"
+    if before:
+        sql += " AND id<?"
+        params.append(before)
+    sql += " ORDER BY id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    conn = get_db()
+    notifs = [dict(n) for n in conn.execute(sql, params)]
+    unread = get_unread_count(conn, user_id)
+    conn.close()
+    next_cursor = notifs[limit - 1]['id'] if len(notifs) > limit else None
+    return jsonify({'items': notifs[:limit], 'unread_count': unread, 'next_cursor': next_cursor})
+
+@app.route('/api/notifications/unread_count')
+@login_required
+def get_unread_count_api():
     conn = get_db()
-    notifs = conn.execute("SELECT * FROM notifications WHERE user_id=? AND is_read=0 ORDER BY created_at DESC", (user_id,)).fetchall()
+    unread = get_unread_count(conn, session['user_id'])
     conn.close()
-    return jsonify([dict(n) for n in notifs])
+    return jsonify({'unread_count': unread})
 
 @app.route('/api/notifications/read', methods=['POST'])
 @login_required
 def mark_notifications_read():
+    data = request.get_json(silent=True) or {}
     conn = get_db()
-    conn.execute("UPDATE notifications SET is_read=1 WHERE user_id=?", (session['user_id'],))
+    marked = mark_notifications_read_upto(conn, session['user_id'], data.get('up_to'))
     conn.commit()
     conn.close()
-    return jsonify({'success': True})
+    prune_notifications(session['user_id'])
+    return jsonify({'success': True, 'marked': marked})
 
 # GSTR-1 Review actions
 @app.route('/gstr1/submit_review', methods=['POST'])
@@ -789,6 +2924,7 @@ def submit_gstr1_review():
     reviewer_id = request.form.get('reviewer_id')
     conn = get_db()
     conn.execute("UPDATE gstr1_records SET status='under_review', reviewer_id=? WHERE id=?", (reviewer_id, record_id))
+    refresh_record_trend(conn, 'gstr1_records', record_id)
     conn.commit()
     add_notification(reviewer_id, 'New Review', 'GSTR-1 submitted for review', 'info')
     conn.close()
@@ -812,6 +2948,7 @@ def gstr1_review_action():
         conn.execute("UPDATE gstr1_records SET status='draft', reviewer_id=NULL WHERE id=?", (record_id,))
         if record:
             add_notification(record['preparer_id'], 'Sent Back', remarks, 'warning')
+    refresh_record_trend(conn, 'gstr1_records', record_id)
     conn.commit()
     conn.close()
     flash('Review action completed', 'success')
@@ -824,7 +2961,82 @@ def file_gstr1():
     arn = request.form.get('arn_number')
     conn = get_db()
     conn.execute("UPDATE gstr1_records SET status='locked', arn_number=?, filed_at=?, locked_at=? WHERE id=?", (arn, datetime.now(), datetime.now(), record_id))
+    refresh_record_trend(conn, 'gstr1_records', record_id)
     conn.commit()
     conn.close()
     flash('GSTR-1 filed and locked', 'success')
     return redirect(url_for('dashboard'))
+
+# Audit log viewer
+def audit_request_args():
+    filters = {}
+    for field in AUDIT_FILTERS:
+        value = request.args.get(field, '').strip()
+        if field == 'action' and value:
+            filters[field] = value
+        elif value.isdigit():
+            filters[field] = int(value)
+    before = request.args.get('before', type=int)
+    limit = min(max(request.args.get('limit', AUDIT_PAGE_SIZE, type=int), 1), 500)
+    return filters, before, limit, request.args.get('archive', '').strip()
+
+def fetch_audit_page(filters, before, limit, archive):
+    if archive:
+        return query_activity_archive(archive, filters, before, limit)
+    conn = get_read_db()
+    try:
+        return query_activity(conn, filters, before, limit)
+    finally:
+        conn.close()
+
+@app.route('/admin/audit')
+@login_required
+@role_required('admin')
+def audit_log():
+    filters, before, limit, archive = audit_request_args()
+    rows, next_cursor = fetch_audit_page(filters, before, limit, archive)
+
+    conn = get_read_db()
+    users = conn.execute("SELECT id, username FROM users ORDER BY username").fetchall()
+    summary = conn.execute("""
+        SELECT substr(day, 1, 7) AS month, SUM(count) AS total FROM activity_daily_summary
+        GROUP BY 1 ORDER BY 1 DESC
+    """).fetchall()
+    conn.close()
+
+    totals = {row['month']: row['total'] for row in summary}
+    archives = list_audit_archives()
+    for entry in archives:
+        entry['total'] = totals.get(entry['month'], 0)
+
+    return render_template('audit_log.html', rows=rows, next_cursor=next_cursor, filters=filters,
+                           archive=archive, archives=archives, users=users, limit=limit,
+                           retention_months=AUDIT_RETENTION_MONTHS)
+
+@app.route('/api/audit')
+@login_required
+@role_required('admin')
+def audit_log_api():
+    filters, before, limit, archive = audit_request_args()
+    rows, next_cursor = fetch_audit_page(filters, before, limit, archive)
+    return jsonify({'items': rows, 'next_cursor': next_cursor})
+
+# Init and run (development server - use serve.py in production)
+if __name__ == '__main__':
+    run_startup_tasks()
+    start_maintenance_scheduler()
+
+    print("="*60)
+    print("GST Pro v2.0 Server Starting...")
+    print("="*60)
+    print("Access URLs:")
+    print("  Local:   http://127.0.0.1:5000")
+    print("  Network: http://YOUR_IP:5000")
+    print("="*60)
+    print("Press CTRL+C to stop")
+    print("="*60)
+
+    try:
+        app.run(host='0.0.0.0', port=5000, debug=False)
+    finally:
+        run_shutdown_tasks()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Bytes-transferred benchmark for GST Pro
+Replays a typical preparer/admin session (login, dashboard, GSTR-1 and GSTR-3B forms,
+reports, client history, notifications, admin panel) against a scratch database and
+counts the response body bytes a browser would download.
+
+  plain:       no compression, every page re-downloads its CSS/JS
+               (how pages behaved with inline scripts and uncached static files)
+  compressed:  gzip/brotli responses, hashed assets downloaded once and then cached
+  repeat:      the same session again with a warm browser cache
+
+Usage:
+  python benchmark_assets.py
+  python benchmark_assets.py --clients 200
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSET_RE = re.compile(r'(?:href|src)="(/(?:static|assets)/[^"]+)"')
+
+
+def seed(gstpro, clients):
+    gstpro.run_startup_tasks()
+    month, year = gstpro.get_current_month_year()
+    conn = gstpro.get_db()
+    conn.executemany("INSERT INTO clients (client_name, gstin) VALUES (?, ?)",
+                     [(f"Client {i:04d} Traders", f"27AAAC{i:05d}Z") for i in range(1, clients + 1)])
+    conn.execute("""
+        INSERT INTO gstr1_records (client_id, month, year, status, b2b_sales, total_sales, total_cgst, arn_number)
+        VALUES (1, ?, ?, 'locked', 12345600, 12345600, 111100, 'AA1')
+    """, (month, year))
+    conn.commit()
+    conn.close()
+    return [
+        '/login', '/dashboard', f'/gstr1/1/{month}/{year}', f'/gstr3b/1/{month}/{year}',
+        '/clients/1/history', '/api/notifications', '/reports', '/admin', '/api/clients/search?q=client',
+        '/dashboard', f'/gstr1/1/{month}/{year}',
+    ]
+
+
+def run_session(client, pages, accept_encoding, cache):
+    """Returns [(path, page_bytes, asset_bytes)]; cache is the set of asset URLs already held"""
+    headers = {'Accept-Encoding': accept_encoding}
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'}, headers=headers)
+    results = []
+    for path in pages:
+        response = client.get(path, headers=headers)
+        page_bytes = len(response.data)
+        asset_bytes = 0
+        if response.mimetype == 'text/html':
+            html = response.get_data()
+            if response.headers.get('Content-Encoding') == 'gzip':
+                import gzip
+                html = gzip.decompress(html)
+            for url in ASSET_RE.findall(html.decode('utf-8')):
+                if cache is not None and url in cache:
+                    continue
+                asset = client.get(url, headers=headers, follow_redirects=True)
+                asset_bytes += len(asset.data)
+                if cache is not None and 'immutable' in asset.headers.get('Cache-Control', ''):
+                    cache.add(url)
+        results.append((path, page_bytes, asset_bytes))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GST Pro bytes-transferred benchmark')
+    parser.add_argument('--clients', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        sys.path.insert(0, APP_DIR)
+        import app as gstpro
+        pages = seed(gstpro, args.clients)
+
+        client = gstpro.app.test_client()
+        plain = run_session(client, pages, 'identity', cache=None)
+        browser_cache = set()
+        compressed = run_session(client, pages, 'gzip, deflate, br', cache=browser_cache)
+        repeat = run_session(client, pages, 'gzip, deflate, br', cache=browser_cache)
+        os.chdir(APP_DIR)
+
+    print("="*72)
+    print(f"{'Request':<36}{'plain':>12}{'compressed':>12}{'repeat':>12}")
+    for (path, p_page, p_assets), (_, c_page, c_assets), (_, r_page, r_assets) in zip(plain, compressed, repeat):
+        print(f"{path[:35]:<36}{p_page + p_assets:>12,}{c_page + c_assets:>12,}{r_page + r_assets:>12,}")
+    totals = [sum(page + assets for _, page, assets in run) for run in (plain, compressed, repeat)]
+    print("-"*72)
+    print(f"{'Session total (bytes)':<36}{totals[0]:>12,}{totals[1]:>12,}{totals[2]:>12,}")
+    print(f"{'vs plain':<36}{'':>12}{totals[1] / totals[0]:>12.0%}{totals[2] / totals[0]:>12.0%}")
+    print("="*72)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Streamed page benchmark for GST Pro
+Seeds a scratch database with many users and a preparer with many assigned clients,
+then measures time-to-first-byte, total time and peak Python memory (tracemalloc) of:
+
+  full:      every row fetched with fetchall() and the page rendered at once with
+             render_template (how the admin panel and dashboard rendered before)
+  streamed:  the current pages - one keyset page of rows read from a cursor while
+             the template streams out in chunks
+
+Usage:
+  python benchmark_pages.py
+  python benchmark_pages.py --users 5000 --clients 20000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class FullList(list):
+    """All rows at once, with the attributes the templates read from a RowPage"""
+
+    def __init__(self, rows, sort):
+        super().__init__(rows)
+        self.sort, self.order, self.next_cursor = sort, 'asc', None
+
+
+def seed(gstpro, users, clients):
+    from werkzeug.security import generate_password_hash
+    gstpro.run_startup_tasks()
+    month, year = gstpro.get_current_month_year()
+    conn = gstpro.get_db()
+    password = generate_password_hash('bench')
+    conn.executemany("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+                     [(f"staff{i:05d}", password, 'preparer' if i % 4 else 'reviewer') for i in range(users)])
+    conn.executemany("INSERT INTO clients (client_name, gstin) VALUES (?, ?)",
+                     [(f"Client {i:05d} Traders", f"27AAAC{i:05d}Z") for i in range(1, clients + 1)])
+    preparer = conn.execute("SELECT id FROM users WHERE username = 'staff00001'").fetchone()[0]
+    conn.executemany("""
+        INSERT INTO client_assignments (client_id, month, year, gstr1_preparer_id, gstr3b_preparer_id)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(i, month, year, preparer, preparer) for i in range(1, clients + 1)])
+    conn.commit()
+    conn.close()
+
+
+def add_full_routes(gstpro):
+    """The previous rendering: fetchall() everything, render_template the whole page"""
+    from flask import render_template, session
+    app = gstpro.app
+
+    def admin_full():
+        conn = gstpro.get_db()
+        users = conn.execute("SELECT * FROM users ORDER BY role, username").fetchall()
+        preparers = [u for u in users if u['role'] == 'preparer']
+        conn.close()
+        return render_template('admin_panel.html', users=FullList(users, 'role'), preparers=preparers)
+
+    def dashboard_full():
+        month, year = gstpro.get_current_month_year()
+        conn = gstpro.get_read_db()
+        rows = conn.execute(gstpro.WORKLIST_SQL + " ORDER BY lower(c.client_name)",
+                            [month, year] * 3 + [session['user_id']] * 2).fetchall()
+        conn.close()
+        notifications, unread = gstpro.get_notifications(session['user_id'])
+        return render_template('dashboard.html', user_role='preparer', view='preparer',
+                               current_month=month, current_year=year, month=month, year=year,
+                               fy=gstpro.get_financial_year(month, year), month_name='', period_name='',
+                               notifications=notifications, unread_count=unread,
+                               assigned_clients=FullList(rows, 'client'))
+
+    app.add_url_rule('/bench/admin_full', 'bench_admin_full', gstpro.login_required(admin_full))
+    app.add_url_rule('/bench/dashboard_full', 'bench_dashboard_full', gstpro.login_required(dashboard_full))
+
+
+def measure(client, path):
+    """(ttfb_ms, total_ms, peak_kb, body_bytes) for one GET, reading the body chunk by chunk"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(path, buffered=False)
+    chunks = iter(response.response)
+    size = len(next(chunks, b''))
+    ttfb = time.perf_counter() - started
+    for chunk in chunks:
+        size += len(chunk)
+    response.close()
+    total = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return ttfb * 1000, total * 1000, peak / 1024, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GST Pro streamed page benchmark')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per page, best is reported')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        sys.path.insert(0, APP_DIR)
+        import app as gstpro
+        seed(gstpro, args.users, args.clients)
+        add_full_routes(gstpro)
+
+        admin = gstpro.app.test_client()
+        admin.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        preparer = gstpro.app.test_client()
+        preparer.post('/login', data={'username': 'staff00001', 'password': 'bench'})
+
+        pages = [
+            (f'Admin panel ({args.users} users)', admin, '/bench/admin_full', '/admin'),
+            (f'Preparer dashboard ({args.clients} clients)', preparer, '/bench/dashboard_full', '/dashboard'),
+        ]
+        results = []
+        for label, client, full_path, streamed_path in pages:
+            runs = {}
+            for mode, path in (('full', full_path), ('streamed', streamed_path)):
+                samples = [measure(client, path) for _ in range(args.repeat)]
+                runs[mode] = tuple(min(s[i] for s in samples) for i in range(4))
+            results.append((label, runs))
+        os.chdir(APP_DIR)
+
+    print("="*78)
+    print(f"{'Page':<38}{'mode':<10}{'TTFB ms':>9}{'total ms':>10}{'peak KB':>10}{'bytes':>11}")
+    for label, runs in results:
+        for mode, (ttfb, total, peak, size) in runs.items():
+            print(f"{label[:37]:<38}{mode:<10}{ttfb:>9.1f}{total:>10.1f}{peak:>10,.0f}{size:>11,}")
+        print("-"*78)
+    print("streamed pages show one page of rows (PAGE_SIZE); the rest are a 'Next' link away")
+    print("="*78)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for GST Pro
+Measures how long `import app` takes, the resident memory afterwards, and the cost of
+run_startup_tasks() on a fresh database versus one whose schema is already current.
+Each measurement runs in a fresh interpreter inside a scratch directory.
+
+Usage:
+  python benchmark_startup.py                        # print the numbers
+  python benchmark_startup.py --max-import-ms 800 --max-rss-mb 80
+      # exit with an error if startup regresses past the given limits
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = r"""
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+t0 = time.perf_counter()
+import app
+import_ms = (time.perf_counter() - t0) * 1000
+t0 = time.perf_counter()
+app.run_startup_tasks()
+startup_ms = (time.perf_counter() - t0) * 1000
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+except ImportError:
+    rss_mb = None
+print(json.dumps({'import_ms': import_ms, 'startup_ms': startup_ms, 'rss_mb': rss_mb,
+                  'pandas_loaded': 'pandas' in sys.modules}))
+"""
+
+
+def probe(workdir):
+    out = subprocess.run([sys.executable, '-c', PROBE, APP_DIR], cwd=workdir,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GST Pro startup benchmark')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--max-import-ms', type=float)
+    parser.add_argument('--max-rss-mb', type=float)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cold = probe(workdir)  # creates the schema
+        warm = [probe(workdir) for _ in range(args.runs)]
+
+    import_ms = min(r['import_ms'] for r in warm)
+    startup_ms = min(r['startup_ms'] for r in warm)
+    rss_values = [r['rss_mb'] for r in warm if r['rss_mb'] is not None]
+    rss_mb = min(rss_values) if rss_values else None
+
+    print("="*50)
+    print(f"import app:          {import_ms:.0f} ms")
+    print(f"startup (new db):    {cold['startup_ms']:.0f} ms")
+    print(f"startup (current):   {startup_ms:.0f} ms")
+    print(f"peak RSS:            {rss_mb:.1f} MB" if rss_mb is not None else "peak RSS:            n/a")
+    print(f"pandas imported:     {'yes' if any(r['pandas_loaded'] for r in warm) else 'no'}")
+    print("="*50)
+
+    failed = False
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"FAIL: import took {import_ms:.0f} ms (limit {args.max_import_ms:.0f} ms)")
+        failed = True
+    if args.max_rss_mb is not None and rss_mb is not None and rss_mb > args.max_rss_mb:
+        print(f"FAIL: RSS {rss_mb:.1f} MB (limit {args.max_rss_mb:.1f} MB)")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Firm (shard) administration for multi-firm GST Pro
+Each firm has its own database under firms/; these commands run against every firm in parallel.
+
+Usage:
+  python firms.py list
+  python firms.py create <firm> [--from gst_database.db]   # new firm, optionally from an existing database
+  python firms.py migrate                                    # bring every firm's schema up to date
+  python firms.py backup [--label 20260401]                 # backup every firm
+  python firms.py archive <fy>                               # archive an FY for every firm, e.g. 2024-25
+  python firms.py metrics                                    # size and row counts per firm
+  python firms.py maintain                                   # ANALYZE, integrity check, vacuum and checkpoint now
+  python firms.py rebuild-itc                                # recompute the ITC carry-forward ledger
+
+Start the server with GSTPRO_MULTI_FIRM=1 to serve these firms. Users reach their firm at
+http://<firm>.<host>:5000, http://<host>:5000/f/<firm>/, or by entering the firm on the login page.
+"""
+
+import argparse
+import os
+import sys
+
+os.environ['GSTPRO_MULTI_FIRM'] = '1'
+import app as gstpro
+
+
+def print_results(results, describe=str):
+    failed = 0
+    for firm, result in sorted(results.items()):
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"  ✗ {firm}: {result}")
+        else:
+            print(f"  ✓ {firm}: {describe(result)}")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GST Pro firm administration')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list')
+    create = sub.add_parser('create')
+    create.add_argument('firm')
+    create.add_argument('--from', dest='source')
+    sub.add_parser('migrate')
+    backup = sub.add_parser('backup')
+    backup.add_argument('--label')
+    archive = sub.add_parser('archive')
+    archive.add_argument('fy')
+    sub.add_parser('metrics')
+    sub.add_parser('maintain')
+    sub.add_parser('rebuild-itc')
+    parser.add_argument('--workers', type=int, default=8, help='firms processed in parallel')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for firm in gstpro.list_firms():
+            print(firm)
+        return 0
+
+    if args.command == 'create':
+        try:
+            gstpro.create_firm(args.firm, args.source)
+        except ValueError as e:
+            print(f"✗ {e}")
+            return 1
+        print(f"✓ Firm '{args.firm}' created at {gstpro.firm_db_path(args.firm)}")
+        return 0
+
+    if args.command == 'migrate':
+        results = gstpro.for_each_firm(lambda firm: gstpro.init_db(), args.workers)
+        return print_results(results, lambda r: f"schema v{gstpro.SCHEMA_VERSION}")
+
+    if args.command == 'backup':
+        results = gstpro.for_each_firm(lambda firm: gstpro.backup_shard(args.label), args.workers)
+        return print_results(results)
+
+    if args.command == 'archive':
+        results = gstpro.for_each_firm(lambda firm: gstpro.archive_shard(args.fy), args.workers)
+        return print_results(results)
+
+    if args.command == 'metrics':
+        results = gstpro.for_each_firm(lambda firm: gstpro.shard_metrics(), args.workers)
+        return print_results(results, lambda m: ", ".join(f"{k}={v}" for k, v in m.items()))
+
+    if args.command == 'maintain':
+        results = gstpro.for_each_firm(lambda firm: gstpro.run_maintenance(force=True), args.workers)
+        return print_results(results, ", ".join)
+
+    if args.command == 'rebuild-itc':
+        def rebuild(firm):
+            conn = gstpro.get_db()
+            written = gstpro.rebuild_itc_ledger(conn)
+            conn.commit()
+            conn.close()
+            return written
+        results = gstpro.for_each_firm(rebuild, args.workers)
+        return print_results(results, lambda n: f"{n} periods recomputed")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,8 +9,11 @@ import sys
 from werkzeug.security import generate_password_hash
 from datetime import datetime
 
+import app as gstpro
+
 def create_demo_data():
     conn = sqlite3.connect('gst_database.db')
+    conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
     print("🚀 GST Pro Demo Data Generator")
@@ -109,9 +112,13 @@ def create_demo_data():
     sample_clients = client_ids[:4]  # First 4 clients
 
     for client_id in sample_clients:
-        b2b = round(random.uniform(50000, 500000), 2)
-        b2c = round(random.uniform(20000, 200000), 2)
-        tally = b2b + b2c  # Perfect match for demo
+        # Amounts are stored in paise, as the GSTR-1 autosave does
+        b2b = gstpro.to_paise(round(random.uniform(50000, 500000), 2))
+        b2c = gstpro.to_paise(round(random.uniform(20000, 200000), 2))
+        total = b2b + b2c
+        tally = total  # Perfect match for demo
+        cgst = sgst = round(b2b * 0.09)
+        igst = round(b2c * 0.18)
 
         try:
             cursor.execute("""
@@ -119,10 +126,11 @@ def create_demo_data():
                 (client_id, month, year, status, b2b_sales, b2c_sales, total_sales, 
                 sales_as_per_tally, variance, total_cgst, total_sgst, total_igst,
                 chk_sales, chk_purchase, chk_notes, preparer_id, prepared_at)
-                VALUES (?, ?, ?, 'draft', ?, ?, ?, ?, 0, ?, ?, ?, 1, 1, 1, ?, ?)
-            """, (client_id, month, year, b2b, b2c, b2b+b2c, tally, 
-                  b2b*0.09, b2b*0.09, b2c*0.18, preparers[0], datetime.now()))
-            print(f"   ✓ Client {client_id}: ₹{b2b+b2c:,.2f}")
+                VALUES (?, ?, ?, 'draft', ?, ?, ?, ?, ?, ?, ?, ?, 1, 1, 1, ?, ?)
+            """, (client_id, month, year, b2b, b2c, total, tally, total - tally,
+                  cgst, sgst, igst, preparers[0], datetime.now()))
+            gstpro.refresh_client_trend(conn, client_id, month, year)
+            print(f"   ✓ Client {client_id}: ₹{gstpro.to_rupees(total):,.2f}")
         except Exception as e:
             print(f"   ! Client {client_id}: {e}")
 
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Simple load test for GST Pro
+Compares the development server (python app.py) with the production server (python serve.py).
+
+Usage:
+  python loadtest.py --url http://127.0.0.1:5000 --clients 20 --seconds 15
+
+  python loadtest.py --scenario export-autosave --month 3 --year 2026 --client-ids 1-20
+      # FY exports run back to back while preparers autosave GSTR-1 records;
+      # exits with an error if either side stalls longer than --stall-ms
+
+  python loadtest.py --scenario export-autosave --in-process --client-ids 1-200
+      # same check without a running server: the app is driven through its test client
+      # against a temporary database seeded with those clients and a year of GSTR-1 data
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCAL_URL = 'http://localhost'
+PATHS = ['/dashboard', '/reports', '/api/notifications', '/admin']
+
+
+def client_loop(base_url, username, password, deadline, results, errors):
+    opener = login(base_url, username, password)
+
+    i = 0
+    while time.time() < deadline:
+        path = PATHS[i % len(PATHS)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            opener.open(f"{base_url}{path}", timeout=30).read()
+            results.append(time.perf_counter() - start)
+        except Exception:
+            errors.append(path)
+
+
+class LocalOpener:
+    """urllib-style opener over the Flask test client, for --in-process runs"""
+
+    app = None
+
+    def __init__(self):
+        self.client = self.app.test_client()
+
+    def open(self, req, data=None, timeout=None):
+        headers = {}
+        if isinstance(req, urllib.request.Request):
+            req, data, headers = req.full_url, req.data, dict(req.header_items())
+        if data is None:
+            response = self.client.get(req)
+        else:
+            headers.setdefault('Content-Type', 'application/x-www-form-urlencoded')
+            response = self.client.post(req, data=data, headers=headers)
+        if response.status_code >= 400:
+            raise urllib.error.HTTPError(req, response.status_code, response.status, None, None)
+        return io.BytesIO(response.get_data())
+
+
+def seed_local_app(workdir, client_ids, month, year):
+    """Import the app against a fresh database in workdir with clients and a year of GSTR-1 data"""
+    os.chdir(workdir)
+    sys.path.insert(0, APP_DIR)
+    import app as gstpro
+    gstpro.run_startup_tasks()
+    conn = gstpro.get_db()
+    conn.executemany("INSERT INTO clients (client_name, gstin) VALUES (?, ?)",
+                     [(f"Client {i:05d}", f"27AAAC{i:05d}Z") for i in range(1, max(client_ids) + 1)])
+    rows = []
+    for m, y in gstpro.get_fy_periods(month, year):
+        for client_id in client_ids:
+            b2b, b2c = random.randint(10**5, 5 * 10**7), random.randint(10**5, 2 * 10**7)
+            rows.append((client_id, m, y, b2b, b2c, b2b + b2c, b2b + b2c, b2b * 9 // 100, b2b * 9 // 100))
+    conn.executemany("""
+        INSERT INTO gstr1_records (client_id, month, year, b2b_sales, b2c_sales, total_sales,
+                                   sales_as_per_tally, total_cgst, total_sgst)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+    LocalOpener.app = gstpro.app
+
+
+def login(base_url, username, password):
+    if LocalOpener.app is not None:
+        opener = LocalOpener()
+    else:
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    data = urllib.parse.urlencode({'username': username, 'password': password}).encode()
+    opener.open(f"{base_url}/login", data=data).read()
+    return opener
+
+
+def autosave_loop(opener, base_url, record_ids, deadline, results, errors):
+    while time.time() < deadline:
+        payload = json.dumps({
+            'record_id': random.choice(record_ids),
+            'b2b_sales': round(random.uniform(1000, 500000), 2),
+            'b2c_sales': round(random.uniform(1000, 200000), 2),
+            'sales_as_per_tally': round(random.uniform(1000, 700000), 2),
+        }).encode()
+        req = urllib.request.Request(f"{base_url}/api/gstr1/autosave", data=payload,
+                                     headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            opener.open(req, timeout=60).read()
+            results.append(time.perf_counter() - start)
+        except Exception:
+            errors.append('autosave')
+
+
+def export_loop(opener, base_url, month, year, deadline, results, errors):
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            opener.open(f"{base_url}/export/excel?view=fy&month={month}&year={year}", timeout=120).read()
+            results.append(time.perf_counter() - start)
+        except Exception:
+            errors.append('export')
+
+
+def summarize(name, results, errors, seconds):
+    results.sort()
+    count = len(results)
+    line = f"{name:<10}  {count} requests ({count / seconds:.1f}/s), errors: {len(errors)}"
+    if count:
+        line += (f", p50 {results[count // 2] * 1000:.0f} ms, p95 {results[int(count * 0.95)] * 1000:.0f} ms,"
+                 f" max {results[-1] * 1000:.0f} ms")
+    print(line)
+    return results[-1] * 1000 if count else None
+
+
+def run_export_autosave(args):
+    first, _, last = args.client_ids.partition('-')
+    client_ids = range(int(first), int(last or first) + 1)
+
+    # Opening the GSTR-1 form creates the record; its id is in the page's GSTR1_FORM config
+    opener = login(args.url, args.username, args.password)
+    record_ids = []
+    for client_id in client_ids:
+        page = opener.open(f"{args.url}/gstr1/{client_id}/{args.month}/{args.year}").read().decode()
+        match = re.search(r'"recordId": (\d+)', page)
+        if match:
+            record_ids.append(int(match.group(1)))
+    if not record_ids:
+        print("No GSTR-1 records found for the given client ids")
+        return 1
+
+    saves, save_errors, exports, export_errors = [], [], [], []
+    deadline = time.time() + args.seconds
+    threads = [threading.Thread(target=export_loop, args=(login(args.url, args.username, args.password),
+                                args.url, args.month, args.year, deadline, exports, export_errors))]
+    threads += [threading.Thread(target=autosave_loop, args=(login(args.url, args.username, args.password),
+                                 args.url, record_ids, deadline, saves, save_errors))
+                for _ in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print("="*50)
+    target = 'in-process test client' if LocalOpener.app is not None else args.url
+    print(f"Target:     {target}, {args.clients} preparers + 1 FY exporter for {args.seconds}s")
+    worst = [summarize('autosave', saves, save_errors, args.seconds),
+             summarize('fy export', exports, export_errors, args.seconds)]
+    print("="*50)
+    if save_errors or export_errors or None in worst or max(worst) > args.stall_ms:
+        print(f"FAIL: a request errored, never completed or took longer than {args.stall_ms} ms")
+        return 1
+    print("OK: neither exports nor autosaves stalled")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GST Pro load test')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--seconds', type=int, default=15)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--scenario', choices=['pages', 'export-autosave'], default='pages')
+    parser.add_argument('--month', type=int, default=3)
+    parser.add_argument('--year', type=int, default=2026)
+    parser.add_argument('--client-ids', default='1-20', help='range of client ids to autosave, e.g. 1-50')
+    parser.add_argument('--stall-ms', type=float, default=2000)
+    parser.add_argument('--in-process', action='store_true',
+                        help='export-autosave only: no server needed, runs against a temporary database')
+    args = parser.parse_args()
+
+    if args.scenario == 'export-autosave' and args.in_process:
+        first, _, last = args.client_ids.partition('-')
+        with tempfile.TemporaryDirectory() as workdir:
+            seed_local_app(workdir, range(int(first), int(last or first) + 1), args.month, args.year)
+            args.url = LOCAL_URL
+            try:
+                return run_export_autosave(args)
+            finally:
+                os.chdir(APP_DIR)
+    if args.scenario == 'export-autosave':
+        return run_export_autosave(args)
+
+    results, errors = [], []
+    deadline = time.time() + args.seconds
+    threads = [threading.Thread(target=client_loop,
+                                args=(args.url, args.username, args.password, deadline, results, errors))
+               for _ in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    results.sort()
+    count = len(results)
+    print("="*50)
+    print(f"Target:     {args.url}")
+    print(f"Clients:    {args.clients} for {args.seconds}s")
+    print(f"Requests:   {count} ({count / args.seconds:.1f} req/s), errors: {len(errors)}")
+    if count:
+        print(f"Latency:    p50 {results[count // 2] * 1000:.0f} ms, "
+              f"p95 {results[int(count * 0.95)] * 1000:.0f} ms, max {results[-1] * 1000:.0f} ms")
+    print("="*50)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
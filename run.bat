@@ -9,4 +9,4 @@ echo To find IP: run 'ipconfig' in Command Prompt
 echo.
 echo Close this window to stop the server
 echo.
-python app.py
\ No newline at end of file
+python serve.py
\ No newline at end of file
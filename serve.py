@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+GST Pro v2.0 - Production Server
+Runs the app under a real WSGI server instead of the Flask development server.
+
+  Windows:        waitress, one process with a pool of threads
+  Linux / macOS:  gunicorn, several worker processes each with threads
+                  (falls back to waitress if gunicorn is not installed)
+
+Usage:
+  python serve.py                          # defaults, see below
+  python serve.py --workers 4 --threads 8 --port 5000
+
+Settings can also come from environment variables:
+  GSTPRO_HOST, GSTPRO_PORT, GSTPRO_WORKERS, GSTPRO_THREADS
+"""
+
+import argparse
+import os
+import signal
+import sys
+
+import app as gstpro
+
+
+def parse_args():
+    cpus = os.cpu_count() or 2
+    parser = argparse.ArgumentParser(description='GST Pro production server')
+    parser.add_argument('--host', default=os.environ.get('GSTPRO_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('GSTPRO_PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('GSTPRO_WORKERS', min(cpus, 4))),
+                        help='worker processes (gunicorn only; waitress always uses one process)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('GSTPRO_THREADS', 8)),
+                        help='threads per worker')
+    parser.add_argument('--server', choices=['auto', 'waitress', 'gunicorn'], default='auto')
+    return parser.parse_args()
+
+
+def print_banner(args, server_name):
+    print("="*60)
+    print("GST Pro v2.0 Production Server Starting...")
+    print("="*60)
+    print(f"  Server:  {server_name}")
+    if server_name == 'gunicorn':
+        print(f"  Workers: {args.workers} x {args.threads} threads")
+    else:
+        print(f"  Threads: {args.threads}")
+    print(f"  Local:   http://127.0.0.1:{args.port}")
+    print(f"  Network: http://YOUR_IP:{args.port}")
+    print("="*60)
+    print("Press CTRL+C to stop")
+    print("="*60)
+
+
+def serve_waitress(args):
+    from waitress import create_server
+
+    gstpro.run_startup_tasks()
+    gstpro.start_maintenance_scheduler()
+    server = create_server(gstpro.app, host=args.host, port=args.port, threads=args.threads)
+
+    # Treat SIGTERM (service stop) the same as CTRL+C so in-flight requests finish
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+
+    print_banner(args, 'waitress')
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Waits for busy threads to finish their current request before closing
+        server.close()
+        gstpro.run_shutdown_tasks()
+
+
+def serve_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class GSTProApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{args.host}:{args.port}")
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('threads', args.threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('graceful_timeout', 30)
+            # Hooks run in the master process: startup and shutdown happen once, not per worker
+            self.cfg.set('on_starting', lambda arbiter: gstpro.run_startup_tasks())
+            # The maintenance scheduler lives in the master too, so it runs once rather than per worker
+            self.cfg.set('when_ready', lambda arbiter: gstpro.start_maintenance_scheduler())
+            self.cfg.set('on_exit', lambda arbiter: gstpro.run_shutdown_tasks())
+
+        def load(self):
+            return gstpro.app
+
+    print_banner(args, 'gunicorn')
+    GSTProApplication().run()
+
+
+def main():
+    args = parse_args()
+    server = args.server
+    if server == 'auto':
+        server = 'waitress'
+        if os.name != 'nt':
+            try:
+                import gunicorn  # noqa: F401
+                server = 'gunicorn'
+            except ImportError:
+                pass
+
+    if server == 'gunicorn':
+        serve_gunicorn(args)
+    else:
+        serve_waitress(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+let saveTimeout;
+
+// Real-time calculation
+function calculateTotals() {
+    const b2b = parseFloat(document.getElementById('b2b_sales').value) || 0;
+    const b2c = parseFloat(document.getElementById('b2c_sales').value) || 0;
+    const credit = parseFloat(document.getElementById('credit_note').value) || 0;
+    const debit = parseFloat(document.getElementById('debit_note').value) || 0;
+    const sez = parseFloat(document.getElementById('sez_exempted').value) || 0;
+    const tally = parseFloat(document.getElementById('sales_as_per_tally').value) || 0;
+
+    const total = b2b + b2c - credit + debit + sez;
+    const variance = total - tally;
+
+    document.getElementById('display_total').textContent = '₹ ' + total.toFixed(2);
+
+    const varElem = document.getElementById('display_variance');
+    if (Math.abs(variance) < 0.01) {
+        varElem.innerHTML = '<span style="color: var(--success);">✓ Matched</span>';
+    } else {
+        varElem.textContent = '₹ ' + variance.toFixed(2);
+        varElem.className = 'calc-value ' + (variance > 0 ? 'variance-positive' : 'variance-negative');
+    }
+}
+
+// Auto-save functionality
+function queueSave() {
+    clearTimeout(saveTimeout);
+    saveTimeout = setTimeout(autoSave, 1500); // Save after 1.5s of no typing
+}
+
+function autoSave() {
+    if (!GSTR1_FORM.canEdit) return;
+    const data = {
+        record_id: GSTR1_FORM.recordId,
+        b2b_sales: document.getElementById('b2b_sales').value,
+        b2c_sales: document.getElementById('b2c_sales').value,
+        credit_note: document.getElementById('credit_note').value,
+        debit_note: document.getElementById('debit_note').value,
+        sez_exempted: document.getElementById('sez_exempted').value,
+        sales_as_per_tally: document.getElementById('sales_as_per_tally').value,
+        total_cgst: document.getElementById('total_cgst').value,
+        total_sgst: document.getElementById('total_sgst').value,
+        total_igst: document.getElementById('total_igst').value
+    };
+
+    fetch('/api/gstr1/autosave', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify(data)
+    })
+    .then(r => r.json())
+    .then(data => {
+        if (data.success) {
+            showSaveIndicator();
+        }
+    });
+}
+
+function showSaveIndicator() {
+    const ind = document.getElementById('saveIndicator');
+    ind.classList.add('show');
+    setTimeout(() => ind.classList.remove('show'), 2000);
+}
+
+// Checklist update with timestamp
+function updateChecklist(field, checked) {
+    if (!GSTR1_FORM.canEdit) return;
+    fetch('/api/gstr1/checklist', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({
+            record_id: GSTR1_FORM.recordId,
+            field: field,
+            checked: checked
+        })
+    })
+    .then(r => r.json())
+    .then(data => {
+        if (data.success && checked) {
+            // Add timestamp visually
+            const label = document.querySelector(`label[for="chk_${field}"]`);
+            const timestamp = new Date().toLocaleString('en-IN', {
+                day: '2-digit', month: 'short', hour: '2-digit', minute: '2-digit'
+            });
+
+            // Remove existing timestamp if any
+            const existing = label.querySelector('.timestamp');
+            if (existing) existing.remove();
+
+            // Add new timestamp
+            const span = document.createElement('span');
+            span.className = 'timestamp';
+            span.textContent = '✓ ' + timestamp;
+            label.appendChild(span);
+        }
+    });
+}
+
+// Initial calculation
+calculateTotals();
@@ -0,0 +1,135 @@
+let saveTimeout;
+
+function calculate3B() {
+    // Get input values
+    const cgst_tally = parseFloat(document.getElementById('cgst_tally').value) || 0;
+    const sgst_tally = parseFloat(document.getElementById('sgst_tally').value) || 0;
+    const igst_tally = parseFloat(document.getElementById('igst_tally').value) || 0;
+
+    const ineligible_cgst = parseFloat(document.getElementById('ineligible_cgst').value) || 0;
+    const ineligible_sgst = parseFloat(document.getElementById('ineligible_sgst').value) || 0;
+    const ineligible_igst = parseFloat(document.getElementById('ineligible_igst').value) || 0;
+
+    const rcm_cgst = parseFloat(document.getElementById('rcm_cgst').value) || 0;
+    const rcm_sgst = parseFloat(document.getElementById('rcm_sgst').value) || 0;
+    const rcm_igst = parseFloat(document.getElementById('rcm_igst').value) || 0;
+
+    const interest_cgst = parseFloat(document.getElementById('interest_cgst').value) || 0;
+    const interest_sgst = parseFloat(document.getElementById('interest_sgst').value) || 0;
+    const interest_igst = parseFloat(document.getElementById('interest_igst').value) || 0;
+    const late_fee = parseFloat(document.getElementById('late_fee').value) || 0;
+
+    const liability_cgst = parseFloat(document.getElementById('liability_cgst').value) || 0;
+    const liability_sgst = parseFloat(document.getElementById('liability_sgst').value) || 0;
+    const liability_igst = parseFloat(document.getElementById('liability_igst').value) || 0;
+
+    const gstr1_tv = GSTR3B_FORM.gstr1Tv;
+    const liability_tv = parseFloat(document.getElementById('liability_tv').value) || 0;
+
+    // Calculate Eligible ITC
+    const eligible_cgst = cgst_tally + rcm_cgst - ineligible_cgst;
+    const eligible_sgst = sgst_tally + rcm_sgst - ineligible_sgst;
+    const eligible_igst = igst_tally + rcm_igst - ineligible_igst;
+
+    // Net liability: ITC brought forward plus this month's eligible ITC is set off
+    // head by head (same rule as itc_ledger_entry on the server)
+    const heads = {
+        cgst: [liability_cgst, eligible_cgst, interest_cgst],
+        sgst: [liability_sgst, eligible_sgst, interest_sgst],
+        igst: [liability_igst, eligible_igst, interest_igst]
+    };
+    let payable = late_fee, opening = 0, closing = 0;
+    for (const [tax, [liability, eligible, interest]] of Object.entries(heads)) {
+        const available = GSTR3B_FORM.opening[tax] + eligible;
+        const setOff = Math.max(Math.min(liability, available), 0);
+        opening += GSTR3B_FORM.opening[tax];
+        closing += Math.max(available, 0) - setOff;
+        payable += liability - setOff + Math.max(-available, 0) + interest;
+    }
+
+    // Update display
+    document.getElementById('eligible_cgst').textContent = '₹ ' + eligible_cgst.toFixed(2);
+    document.getElementById('eligible_sgst').textContent = '₹ ' + eligible_sgst.toFixed(2);
+    document.getElementById('eligible_igst').textContent = '₹ ' + eligible_igst.toFixed(2);
+    document.getElementById('eligible_total').textContent = '₹ ' + (eligible_cgst + eligible_sgst + eligible_igst).toFixed(2);
+
+    const netElem = document.getElementById('net_total');
+    netElem.textContent = '₹ ' + (payable > 0 ? payable : closing).toFixed(2);
+    document.getElementById('itc_opening').textContent = '₹ ' + opening.toFixed(2);
+    document.getElementById('itc_closing').textContent = '₹ ' + closing.toFixed(2);
+
+    const msgElem = document.getElementById('liability_message');
+    if (payable > 0) {
+        netElem.className = 'result-value positive';
+        msgElem.textContent = 'Tax Payable to Government';
+    } else if (closing > 0) {
+        netElem.className = 'result-value negative';
+        msgElem.textContent = 'Excess ITC - Carry Forward';
+    } else {
+        netElem.className = 'result-value';
+        msgElem.textContent = 'Nil Liability';
+    }
+
+    // Check GSTR-1 vs 3B variance
+    const tv_variance = liability_tv - gstr1_tv;
+    if (Math.abs(tv_variance) > 0.01) {
+        document.getElementById('tv_variance_alert').style.display = 'block';
+        document.getElementById('tv_variance_value').textContent = tv_variance.toFixed(2);
+    } else {
+        document.getElementById('tv_variance_alert').style.display = 'none';
+    }
+}
+
+function queueSave() {
+    if (!GSTR3B_FORM.canEdit) return;
+    clearTimeout(saveTimeout);
+    saveTimeout = setTimeout(autoSave, 1500);
+}
+
+function autoSave() {
+    const data = {
+        record_id: GSTR3B_FORM.recordId,
+        liability_tv: document.getElementById('liability_tv').value,
+        liability_cgst: document.getElementById('liability_cgst').value,
+        liability_sgst: document.getElementById('liability_sgst').value,
+        liability_igst: document.getElementById('liability_igst').value,
+        tv_2b: document.getElementById('tv_2b').value,
+        cgst_2b: document.getElementById('cgst_2b').value,
+        sgst_2b: document.getElementById('sgst_2b').value,
+        igst_2b: document.getElementById('igst_2b').value,
+        tv_tally: document.getElementById('tv_tally').value,
+        cgst_tally: document.getElementById('cgst_tally').value,
+        sgst_tally: document.getElementById('sgst_tally').value,
+        igst_tally: document.getElementById('igst_tally').value,
+        ineligible_cgst: document.getElementById('ineligible_cgst').value,
+        ineligible_sgst: document.getElementById('ineligible_sgst').value,
+        ineligible_igst: document.getElementById('ineligible_igst').value,
+        rcm_cgst: document.getElementById('rcm_cgst').value,
+        rcm_sgst: document.getElementById('rcm_sgst').value,
+        rcm_igst: document.getElementById('rcm_igst').value,
+        interest_cgst: document.getElementById('interest_cgst').value,
+        interest_sgst: document.getElementById('interest_sgst').value,
+        interest_igst: document.getElementById('interest_igst').value,
+        late_fee: document.getElementById('late_fee').value,
+        tv_variance: (parseFloat(document.getElementById('liability_tv').value) || 0) - GSTR3B_FORM.gstr1Tv
+    };
+
+    fetch('/api/gstr3b/save', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify(data)
+    })
+    .then(r => r.json())
+    .then(data => {
+        if (data.success) showSaveIndicator();
+    });
+}
+
+function showSaveIndicator() {
+    const ind = document.getElementById('saveIndicator');
+    ind.classList.add('show');
+    setTimeout(() => ind.classList.remove('show'), 2000);
+}
+
+// Initial calculation
+calculate3B();
@@ -0,0 +1,68 @@
+// Detailed status table on the reports page, filled from /api/period_state.
+// The first load fetches every client; later polls send ?since=<version> and only
+// the clients that changed come back, so just those rows are redrawn (and rows for
+// clients no longer in the list are dropped).
+
+const STATE_FIELDS = ['client_name', 'gstin', 'gstr1_status', 'gstr1_arn', 'gstr1_due',
+                      'gstr3b_status', 'gstr3b_arn', 'gstr3b_due'];
+const REFRESH_MS = 30000;
+let stateVersion = null;
+
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value == null ? '' : value;
+    return div.innerHTML;
+}
+
+function renderRow(row) {
+    return `
+        <td><strong>${escapeHtml(row.client_name)}</strong></td>
+        <td>${escapeHtml(row.gstin || '-')}</td>
+        <td><span class="status-pill status-${row.gstr1_due}">${escapeHtml(row.gstr1_status || 'Not Started')}</span></td>
+        <td>${escapeHtml(row.gstr1_arn || '-')}</td>
+        <td><span class="status-pill status-${row.gstr3b_due}">${escapeHtml(row.gstr3b_status || 'Pending')}</span></td>
+        <td>${escapeHtml(row.gstr3b_arn || '-')}</td>`;
+}
+
+function applyState(state) {
+    const tbody = document.getElementById('reportRows');
+    if (!state.delta) {
+        tbody.innerHTML = '';
+    }
+    for (let i = 0; i < state.count; i++) {
+        const row = {};
+        state.fields.forEach(f => { row[f] = state.columns[f][i]; });
+        let tr = document.getElementById('client-' + row.client_id);
+        if (!tr) {
+            tr = document.createElement('tr');
+            tr.id = 'client-' + row.client_id;
+            tbody.appendChild(tr);
+        }
+        tr.innerHTML = renderRow(row);
+    }
+    (state.removed || []).forEach(id => {
+        const tr = document.getElementById('client-' + id);
+        if (tr) tr.remove();
+    });
+    if (!state.delta && state.count === 0) {
+        tbody.innerHTML = '<tr><td colspan="6" style="text-align: center; color: var(--gray-600);">No active clients</td></tr>';
+    }
+    stateVersion = state.version;
+}
+
+function loadState() {
+    const params = new URLSearchParams({
+        month: PERIOD_STATE.month,
+        year: PERIOD_STATE.year,
+        fields: STATE_FIELDS.join(',')
+    });
+    if (stateVersion) {
+        params.set('since', stateVersion);
+    }
+    fetch(PERIOD_STATE.url + '?' + params.toString())
+    .then(r => r.status === 304 ? null : r.json())
+    .then(state => { if (state) applyState(state); });
+}
+
+loadState();
+setInterval(loadState, REFRESH_MS);